@@ -0,0 +1,81 @@
+import ast
+import os
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+token = os.getenv('TOKEN')
+admin_id = tuple(ast.literal_eval(os.getenv('ADMIN_ID', '()')))
+# Свой Bot API сервер (локальный telegram-bot-api или заглушка webhook_standin.py); по умолчанию - api.telegram.org
+telegram_api_url = os.getenv('TELEGRAM_API_URL')
+
+# Режим получения апдейтов: polling или webhook.
+# В webhook-режиме бот поднимает aiohttp-сервер на WEBHOOK_HOST:WEBHOOK_PORT и принимает апдейты на WEBHOOK_PATH;
+# WEBHOOK_URL - публичный адрес (https://...), по которому его видит Telegram. Без него вебхук не регистрируется
+# (например, при прогоне с заглушкой). WEBHOOK_SECRET сверяется с заголовком X-Telegram-Bot-Api-Secret-Token.
+bot_mode = os.getenv('BOT_MODE', 'polling')
+webhook_url = os.getenv('WEBHOOK_URL')
+webhook_host = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+webhook_port = int(os.getenv('WEBHOOK_PORT', '8080'))
+webhook_path = os.getenv('WEBHOOK_PATH', '/webhook')
+webhook_secret = os.getenv('WEBHOOK_SECRET') or None
+# Процессов-обработчиков апдейтов. Больше 1 - фронт раздает апдейты воркерам по user_id (services/workers.py)
+workers = int(os.getenv('WORKERS', '1'))
+
+# Хранилище FSM: memory (до перезапуска), sqlite (файл FSM_SQLITE_PATH) или redis (REDIS_URL, нужен пакет redis)
+fsm_storage = os.getenv('FSM_STORAGE', 'sqlite')
+fsm_sqlite_path = os.getenv('FSM_SQLITE_PATH', 'fsm.sqlite3')
+redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# База данных: DB_URL целиком, либо PostgreSQL из DB_HOST/DB_PORT/DB_USER/DB_PASS/DB_NAME
+# (как в sqlalchemy_course-main/src/config.py), иначе локальный SQLite.
+# DB_ECHO=1 включает лог каждого запроса (только для отладки)
+if os.getenv('DB_URL'):
+    db_url = os.getenv('DB_URL')
+elif os.getenv('DB_HOST'):
+    db_url = (f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}"
+              f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME')}")
+else:
+    db_url = 'sqlite+aiosqlite:///tg_bot_db.sqlite3'
+db_echo = os.getenv('DB_ECHO', '0').lower() in ('1', 'true', 'yes')
+# Соединений в пуле чтения SQLite (запись всегда идет через одно соединение)
+db_read_pool = int(os.getenv('DB_READ_POOL', '4'))
+# Пул соединений PostgreSQL: постоянные + временные сверх них под пиковую нагрузку
+db_pool_size = int(os.getenv('DB_POOL_SIZE', '10'))
+db_max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
+# Отложенная запись профилей: сброс раз в WRITE_BEHIND_INTERVAL_MS или при WRITE_BEHIND_MAX изменениях
+write_behind_interval = int(os.getenv('WRITE_BEHIND_INTERVAL_MS', '200')) / 1000
+write_behind_max = int(os.getenv('WRITE_BEHIND_MAX', '500'))
+
+# Профиль SQLite: PRAGMA, которые выполняются на каждом новом соединении.
+# WAL - читатели не блокируются писателем; synchronous=NORMAL в WAL безопасен и не fsync'ит каждый коммит;
+# cache_size < 0 - размер кэша страниц в КиБ; busy_timeout - сколько мс ждать блокировку вместо ошибки.
+sqlite_pragmas = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-32000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+    'foreign_keys': os.getenv('SQLITE_FOREIGN_KEYS', 'ON'),
+}
+
+# Исходящие рассылки (services/sender.py): не больше SEND_RATE сообщений в секунду на бота,
+# в один чат - не чаще раза в SEND_CHAT_INTERVAL_MS, SEND_CONCURRENCY запросов одновременно,
+# SEND_RETRIES повторов после 429 или сетевой ошибки
+send_rate = float(os.getenv('SEND_RATE', '30'))
+send_chat_interval = int(os.getenv('SEND_CHAT_INTERVAL_MS', '1000')) / 1000
+send_concurrency = int(os.getenv('SEND_CONCURRENCY', '8'))
+send_retries = int(os.getenv('SEND_RETRIES', '3'))
+
+# Повтор того же нажатия инлайн-кнопки в течение CALLBACK_DEBOUNCE_MS не обрабатывается (0 - выключено)
+callback_debounce = int(os.getenv('CALLBACK_DEBOUNCE_MS', '700')) / 1000
+
+# Метрики хендлеров: эндпоинт Prometheus на METRICS_HOST:METRICS_PORT/metrics (0 - выключен)
+# и сводка в лог раз в METRICS_LOG_INTERVAL секунд (0 - выключена).
+# При WORKERS > 1 на METRICS_PORT отвечает фронт, а воркер i - на METRICS_PORT + i + 1
+metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+metrics_port = int(os.getenv('METRICS_PORT', '0'))
+metrics_log_interval = int(os.getenv('METRICS_LOG_INTERVAL', '300'))
@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+
+
+@dataclass(frozen=True, slots=True)
+class SetInfo:
+    id: int
+    name: str
+    description: str
+
+
+class SetCatalog:
+    """Неизменяемый справочник легальных сетов с индексами по id и по названию.
+
+    Загружается целиком при старте (и по команде админа), после чего заменяется
+    новым объектом с увеличенной версией - старые ссылки продолжают видеть свой снимок.
+    """
+    __slots__ = ('version', 'sets', 'by_id', 'by_name')
+
+    def __init__(self, sets=(), version: int = 0):
+        sets = tuple(sets)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'sets', sets)
+        object.__setattr__(self, 'by_id', MappingProxyType({s.id: s for s in sets}))
+        object.__setattr__(self, 'by_name', MappingProxyType({s.name.casefold(): s for s in sets}))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('SetCatalog is immutable')
+
+    def __iter__(self):
+        return iter(self.sets)
+
+    def __len__(self):
+        return len(self.sets)
+
+    def get(self, set_id: int) -> SetInfo | None:
+        return self.by_id.get(int(set_id))
+
+    def find(self, name: str) -> SetInfo | None:
+        return self.by_name.get(name.casefold())
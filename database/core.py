@@ -1,13 +1,105 @@
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
-from sqlalchemy.dialects.sqlite import insert
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import select, update, delete, literal, case, union_all, event
+from sqlalchemy.orm import selectinload
 from database.models import *
+from database.dto import UserDTO, PlayerCard, SetVoteCard, TournamentCard, TournamentSlot, MatchDTO, LeaderboardEntry
+from database.migrations import run_migrations
+from database.catalog import SetCatalog, SetInfo
+from database.leaderboard import Leaderboard
+from database.write_behind import WriteBehind
 from datetime import datetime, timedelta
+from collections import defaultdict
+from dataclasses import replace
+import logging
+from utils import TTLCache
+from config import (db_url, db_echo, sqlite_pragmas, db_read_pool, db_pool_size, db_max_overflow,
+                    write_behind_interval, write_behind_max)
 
 
-engine = create_async_engine(url='sqlite+aiosqlite:///tg_bot_db.sqlite3', echo=True)
+logger = logging.getLogger(__name__)
+
+# INSERT с ON CONFLICT у каждого диалекта свой, но API (on_conflict_do_*, excluded) одинаковый
+_dialect_inserts = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def make_engine(url: str = db_url, echo: bool = db_echo, pragmas: dict | None = None, **kwargs):
+    """Создает движок; для SQLite вешает на каждое новое соединение PRAGMA из профиля (config.sqlite_pragmas)."""
+    engine = create_async_engine(url=url, echo=echo, **kwargs)
+    if engine.dialect.name == 'sqlite':
+        pragmas = sqlite_pragmas if pragmas is None else pragmas
+
+        @event.listens_for(engine.sync_engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.close()
+
+    return engine
+
+
+def make_engines(url: str = db_url, echo: bool = db_echo, pragmas: dict | None = None) -> tuple:
+    """Движки (писатель, читатели).
+
+    В SQLite писатель в каждый момент один, поэтому у записывающего движка ровно одно
+    соединение: транзакции записи ждут его в очереди пула, а не ловят "database is locked".
+    Чтения идут через отдельный пул WAL-соединений только для чтения и не стоят
+    за долгой записью (закрытие турнира, создание тура).
+    PostgreSQL сам разводит читателей и писателей, там один общий пул на оба.
+    """
+    if make_url(url).get_backend_name() != 'sqlite':
+        shared = make_engine(url, echo, pool_size=db_pool_size, max_overflow=db_max_overflow, pool_pre_ping=True)
+        return shared, shared
+    writer = make_engine(url, echo, pragmas, pool_size=1, max_overflow=0)
+    pragmas = sqlite_pragmas if pragmas is None else pragmas
+    reader = make_engine(url, echo, {**pragmas, 'query_only': 'ON'}, pool_size=db_read_pool, max_overflow=0)
+    return writer, reader
+
+
+def bind_engines(url: str = db_url, echo: bool = db_echo, pragmas: dict | None = None) -> tuple:
+    """Пересоздает движки и перепривязывает к ним сессии (бенчмарки, временные базы)."""
+    global engine, read_engine
+    engine, read_engine = make_engines(url, echo, pragmas)
+    async_session.configure(bind=engine)
+    read_session.configure(bind=read_engine)
+    return engine, read_engine
+
+
+engine, read_engine = make_engines()
+# async_session - транзакции записи, read_session - чтения (меню, карточки, справочники)
 async_session = async_sessionmaker(engine)
+read_session = async_sessionmaker(read_engine)
+
+
+def insert(table):
+    """INSERT диалекта текущей базы (для upsert через ON CONFLICT)."""
+    return _dialect_inserts[engine.dialect.name](table)
+
+# Кэш профилей по tg_id: /start и "Назад" читают отсюда, а не из БД
+USER_CACHE_SIZE = 4096
+USER_CACHE_TTL = 300
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Версия карточки турнира растет при каждом изменении, видимом на экране турнира
+# (регистрация, голос, результат матча, смена статуса). По ней сбрасываются отрисованные карточки.
+tournament_versions = defaultdict(int)
+
+# Справочник сетов, загружается при старте бота (AsyncCore.load_set_catalog)
+set_catalog = SetCatalog()
+
+# Общий рейтинг игроков, загружается при старте (AsyncCore.load_leaderboard) и правится при изменении побед
+leaderboard = Leaderboard()
+
+# Слушатели сбросов кэшей listener(kind, key). В многопроцессном режиме (services/workers.py)
+# пересылают сбросы остальным процессам, а те применяют их через AsyncCore.apply_invalidation.
+invalidation_listeners = []
+
+
+def _publish(kind: str, key=None):
+    for listener in invalidation_listeners:
+        listener(kind, key)
 
 
 class AsyncCore:
@@ -17,128 +109,284 @@ class AsyncCore:
         async with engine.begin() as conn:
             # await conn.run_sync(Base.metadata.drop_all) удаляет все таблицы
             await conn.run_sync(Base.metadata.create_all)
+            # Индексы и ограничения для таблиц, созданных старыми версиями схемы
+            await conn.run_sync(run_migrations)
 
     @staticmethod
-    async def add_user(tg_id: BigInteger, username: str):
-        """Добавляет нового пользователя в базу данных."""
-        async with async_session() as session:
-            await session.execute(insert(UserORM).values(tg_id=tg_id, username=username).prefix_with("OR IGNORE"))
-            await session.commit()
-
+    async def add_user(tg_id: BigInteger, username: str | None):
+        """Добавляет нового пользователя в базу данных или обновляет его username (через write_behind)."""
+        # У пользователя Telegram может не быть @username, а users.username - NOT NULL
+        username = username or str(tg_id)
+        # peek: следом get_user_sts читает тот же профиль, один /start - одно обращение в счетчиках кэша
+        cached = user_cache.peek(tg_id)
+        if cached is not None and cached.username == username:
+            return  # Пользователь уже есть и не менялся - в БД не ходим
+        write_behind.add_user(tg_id, username)
+        user_cache.pop(tg_id)
 
     @staticmethod
-    async def get_user_sts(tg_id: BigInteger):
+    async def _write_batch(users: dict):
+        """Записывает пачку профилей из write_behind одним upsert."""
         async with async_session() as session:
-            return await session.scalar(select(UserORM).where(UserORM.tg_id == tg_id))
+            async with session.begin():
+                stmt = insert(UserORM).values(
+                    [{'tg_id': tg_id, 'username': username} for tg_id, username in users.items()]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[UserORM.tg_id],
+                    set_={'username': stmt.excluded.username},
+                    where=UserORM.username != stmt.excluded.username,
+                ).returning(UserORM.tg_id, UserORM.id, UserORM.username, UserORM.wins, UserORM.losses)
+                changed = (await session.execute(stmt)).all()
+        for tg_id, *entry in changed:
+            user_cache.pop(tg_id)
+            if leaderboard.loaded:
+                leaderboard.update(LeaderboardEntry(*entry))
 
     @staticmethod
-    async def upsert_tournaments(dates: list) -> list:
-        """Проверяет существование турниров на указанные даты и создает новые, если необходимо."""
-        async with async_session() as session:
-            # Получаем существующие турниры на указанные даты
-            stmt = select(TournamentORM).where(TournamentORM.date.in_(dates))
-            result = await session.execute(stmt)
-            existing_tournaments = result.scalars().all()
-            existing_dates = {t.date for t in existing_tournaments}
+    async def flush_writes():
+        """Сбрасывает отложенные записи (по таймеру, перед зависимыми чтениями и при остановке бота)."""
+        await write_behind.flush()
 
-            # Определяем даты, для которых нужно создать новые турниры
-            new_dates = [date for date in dates if date not in existing_dates]
 
-            new_tournaments = []
-            if new_dates:
-                # Создаем новые турниры для недостающих дат
-                insert_stmt = insert(TournamentORM).values(
-                    [
-                        {
-                            'name': f"Турнир {date.strftime('%Y-%m-%d %H:%M')}",
-                            'date': date,
-                            'status': TournamentStatus.PLANNED
-                        }
-                        for date in new_dates
-                    ]
-                ).returning(TournamentORM.id, TournamentORM.name)
+    @staticmethod
+    async def get_user_sts(tg_id: BigInteger) -> UserDTO | None:
+        """Профиль пользователя по tg_id, читается через user_cache."""
+        user = user_cache.get(tg_id)
+        if user is not None:
+            return user
+        pending = write_behind.pending_username(tg_id)
+        async with read_session() as session:
+            orm_user = await session.scalar(select(UserORM).where(UserORM.tg_id == tg_id))
+        if orm_user is None:
+            if pending is None:
+                return None
+            # Новый пользователь еще в очереди: записываем, чтобы получить его id
+            await AsyncCore.flush_writes()
+            async with read_session() as session:
+                orm_user = await session.scalar(select(UserORM).where(UserORM.tg_id == tg_id))
+            if orm_user is None:
+                return None
+        user = UserDTO.from_orm(orm_user)
+        if pending is not None and write_behind.pending_username(tg_id) == pending:
+            user = replace(user, username=pending)
+        user_cache.set(tg_id, user)
+        return user
+
+    @staticmethod
+    def invalidate_user(tg_id: BigInteger | None = None):
+        """Сбрасывает закэшированный профиль (или весь кэш, если tg_id не передан)."""
+        if tg_id is None:
+            user_cache.clear()
+        else:
+            user_cache.pop(tg_id)
+        _publish('user', tg_id)
 
-                result = await session.execute(insert_stmt)
-                await session.commit()
-                new_tournaments = result.fetchall()
+    @staticmethod
+    def tournament_version(tournament_id: int) -> int:
+        return tournament_versions[int(tournament_id)]
 
-            # Объединяем существующие и новые турниры
-            all_tournaments = existing_tournaments + [t._asdict() for t in new_tournaments]
+    @staticmethod
+    def touch_tournament(tournament_id: int):
+        """Помечает карточку турнира устаревшей."""
+        tournament_versions[int(tournament_id)] += 1
+        _publish('tournament', int(tournament_id))
 
-            return all_tournaments
+    @staticmethod
+    async def apply_invalidation(kind: str, key=None):
+        """Применяет сброс, пришедший из другого процесса бота (без повторной рассылки)."""
+        if kind == 'tournament':
+            tournament_versions[key] += 1
+        elif kind == 'user':
+            if key is None:
+                user_cache.clear()
+            else:
+                user_cache.pop(key)
+        elif kind == 'sets':
+            await AsyncCore.load_set_catalog()
+        elif kind == 'leaderboard':
+            await AsyncCore.load_leaderboard()
 
+    @staticmethod
+    def cache_stats() -> dict:
+        """Счетчики попаданий/промахов кэша профилей."""
+        return user_cache.stats()
 
     @staticmethod
-    async def tournament_details(tournament_id: int):
+    async def upsert_tournaments(dates: list) -> list[TournamentSlot]:
+        """Создает недостающие турниры на указанные даты и возвращает все турниры этих дат по порядку."""
         async with async_session() as session:
-            stmt = (
-                select(TournamentORM)
-                .options(
-                    #Возможно оптимальнее использовать selectinload
-                    joinedload(TournamentORM.registrations).joinedload(RegistrationORM.user).joinedload(
-                        UserORM.accounts),
-                    joinedload(TournamentORM.set_votes),
-                    joinedload(TournamentORM.winning_set)
+            async with session.begin():
+                # Уникальный индекс по date делает вставку идемпотентной: существующие слоты пропускаются
+                await session.execute(
+                    insert(TournamentORM).values(
+                        [
+                            {
+                                'name': f"Турнир {date.strftime('%Y-%m-%d %H:%M')}",
+                                'date': date,
+                                'status': TournamentStatus.PLANNED
+                            }
+                            for date in dates
+                        ]
+                    ).on_conflict_do_nothing(index_elements=['date'])
+                )
+                result = await session.execute(
+                    select(TournamentORM.id, TournamentORM.name, TournamentORM.date)
+                    .where(TournamentORM.date.in_(dates))
+                    .order_by(TournamentORM.date)
                 )
+                return [TournamentSlot(*row) for row in result]
+
+
+    @staticmethod
+    async def tournament_card(tournament_id: int, top_sets: int = 3) -> TournamentCard | None:
+        """Карточка турнира тремя плоскими запросами вместо joinedload-цепочки.
+
+        Игроки приходят по одной строке на регистрацию (ники склеены GROUP_CONCAT),
+        голоса за сеты суммируются, сортируются и обрезаются в SQL.
+        После начала турнира добавляются матчи всех туров (четвертый запрос).
+        """
+        async with read_session() as session:
+            head = (await session.execute(
+                select(TournamentORM.id, TournamentORM.name, TournamentORM.date, TournamentORM.status,
+                       SetORM.description)
+                .outerjoin(SetORM, SetORM.id == TournamentORM.winning_set_id)
                 .where(TournamentORM.id == tournament_id)
+            )).one_or_none()
+            if head is None:
+                return None
+
+            players = await session.execute(
+                select(RegistrationORM.user_id, UserORM.tg_id, UserORM.username,
+                       func.aggregate_strings(MtgORM.username, ', '))
+                .outerjoin(UserORM, UserORM.id == RegistrationORM.user_id)
+                .outerjoin(MtgORM, MtgORM.user_id == UserORM.id)
+                .where(RegistrationORM.tournament_id == tournament_id)
+                .group_by(RegistrationORM.id, UserORM.id)
+                .order_by(RegistrationORM.id)
+            )
+            votes = await session.execute(AsyncCore._top_sets_stmt(tournament_id, top_sets))
+            matches = ()
+            if head.status != TournamentStatus.PLANNED:
+                # Паринги и результаты туров для экрана идущего/завершенного турнира
+                matches = await session.execute(
+                    select(MatchORM.id, MatchORM.tournament_id, MatchORM.round,
+                           MatchORM.player1_id, MatchORM.player2_id, MatchORM.result)
+                    .where(MatchORM.tournament_id == tournament_id)
+                    .order_by(MatchORM.round, MatchORM.id)
+                )
+            return TournamentCard(
+                id=head.id,
+                name=head.name,
+                date=head.date,
+                status=head.status,
+                winning_set_name=head.description,
+                players=tuple(
+                    PlayerCard(user_id=user_id, tg_id=tg_id, username=username or "Unknown User",
+                               accounts=accounts or "No accounts")
+                    for user_id, tg_id, username, accounts in players
+                ),
+                top_sets=tuple(SetVoteCard(*row) for row in votes),
+                matches=tuple(MatchDTO(*row) for row in matches),
             )
-            result = await session.execute(stmt)
-            return result.scalars().unique().one_or_none()
+
+    @staticmethod
+    def _top_sets_stmt(tournament_id: int, limit: int):
+        # Суммируем голоса всех игроков по сету, индекс (tournament_id, set_id) покрывает группировку
+        total = func.sum(SetVoteORM.votes).label('votes')
+        return (
+            select(SetVoteORM.set_id, func.min(SetVoteORM.set_name), total)
+            .where(SetVoteORM.tournament_id == tournament_id)
+            .group_by(SetVoteORM.set_id)
+            .order_by(total.desc(), SetVoteORM.set_id)
+            .limit(limit)
+        )
+
+    @staticmethod
+    async def get_top_sets(tournament_id: int, limit: int = 3) -> tuple[SetVoteCard, ...]:
+        """Топ-N сетов турнира по сумме голосов."""
+        async with read_session() as session:
+            result = await session.execute(AsyncCore._top_sets_stmt(tournament_id, limit))
+            return tuple(SetVoteCard(*row) for row in result)
 
     @staticmethod
     async def get_set():
-        async with async_session() as session:
+        async with read_session() as session:
             result = await session.execute(select(SetORM))
             return result.scalars().all()
 
     @staticmethod
-    async def register_user_for_tournament(user_id: int, tournament_id: int, set_id: int):
-        async with async_session() as session:
-            # Проверяем, если пользователь уже зарегистрирован на этот турнир
-            existing_registration = await session.scalar(
-                select(RegistrationORM)
-                .where(RegistrationORM.user_id == user_id)
-                .where(RegistrationORM.tournament_id == tournament_id)
-            )
-
-            if existing_registration:
-                return existing_registration  # Если регистрация уже есть, возвращаем её
+    async def load_set_catalog(publish: bool = False) -> SetCatalog:
+        """Перечитывает таблицу сетов и подменяет справочник новой версией.
+
+        publish=True - то же сделают и остальные процессы бота (команда админа).
+        """
+        global set_catalog
+        sets = await AsyncCore.get_set()
+        set_catalog = SetCatalog(
+            (SetInfo(id=row.id, name=row.set_name, description=row.description) for row in sets),
+            version=set_catalog.version + 1,
+        )
+        if publish:
+            _publish('sets')
+        return set_catalog
 
-            # Создаем новую запись о регистрации
-            registration = RegistrationORM(
-                user_id=user_id,
-                tournament_id=tournament_id,
-                status=RegStatus.CONFIRMED  # Статус регистрации по умолчанию
-            )
-
-            # Добавляем регистрацию в сессию
-            session.add(registration)
-
-            # Обновляем данные в таблице голосования за сет
-            set_vote = await session.scalar(
-                select(SetVoteORM)
-                .where(SetVoteORM.user_id == user_id)
-                .where(SetVoteORM.tournament_id == tournament_id)
-                .where(SetVoteORM.set_id == set_id)
-            )
+    @staticmethod
+    def get_set_catalog() -> SetCatalog:
+        return set_catalog
 
-            if set_vote:
-                set_vote.votes += 1  # Обновляем голос
-            else:
-                set_vote = SetVoteORM(
-                    tournament_id=tournament_id,
-                    set_id=set_id,
-                    set_name=(await session.scalar(
-                        select(SetORM.set_name).where(SetORM.id == set_id)
-                    )),
-                    votes=1,
-                    user_id=user_id
+    @staticmethod
+    async def register_user_for_tournament(tg_id: int, tournament_id: int, set_id: int) -> RegResult:
+        """Регистрирует игрока на турнир и записывает его голос за сет одной транзакцией.
+
+        Регистрация пишется сразу и опирается на уникальный ключ (ON CONFLICT), поэтому
+        повторные и одновременные нажатия не создают дублей; голос добавляется только
+        при новой регистрации. Возвращает RegResult: REGISTERED, ALREADY_REGISTERED,
+        CLOSED (регистрация на турнир закрыта) или UNKNOWN_SET (сета нет в справочнике).
+        """
+        tournament_id, set_id = int(tournament_id), int(set_id)
+        if not set_catalog.version:
+            await AsyncCore.load_set_catalog()
+        set_info = set_catalog.get(set_id)
+        if set_info is None:
+            return RegResult.UNKNOWN_SET
+        set_name = set_info.name
+        if write_behind.pending_username(tg_id) is not None:
+            await AsyncCore.flush_writes()  # пользователь мог еще не попасть в users
+        user_id = select(UserORM.id).where(UserORM.tg_id == tg_id)
+        async with async_session() as session:
+            async with session.begin():
+                # Регистрация: при конфликте по (user_id, tournament_id) ничего не вставится и не вернется
+                registered = await session.scalar(
+                    insert(RegistrationORM)
+                    .from_select(
+                        ['user_id', 'tournament_id', 'status'],
+                        user_id.add_columns(literal(tournament_id), literal(RegStatus.CONFIRMED, RegistrationORM.status.type))
+                        # Регистрация открыта только пока турнир запланирован
+                        .where(select(TournamentORM.id)
+                               .where(TournamentORM.id == tournament_id,
+                                      TournamentORM.status == TournamentStatus.PLANNED)
+                               .exists()),
+                    )
+                    .on_conflict_do_nothing(index_elements=['user_id', 'tournament_id'])
+                    .returning(RegistrationORM.user_id)
                 )
-                session.add(set_vote)
-
-            # Фиксируем изменения в базе данных
-            await session.commit()
-            return registration
+                if registered is None:
+                    # Ничего не вставилось: либо регистрация закрыта, либо игрок уже записан
+                    status = await session.scalar(select(TournamentORM.status).where(TournamentORM.id == tournament_id))
+                    if status != TournamentStatus.PLANNED:
+                        return RegResult.CLOSED
+                    return RegResult.ALREADY_REGISTERED
+                # Голос за сет в той же транзакции: регистрация без голоса не остается ни при каком сбое
+                vote = insert(SetVoteORM).values(
+                    user_id=registered, tournament_id=tournament_id, set_id=set_id, set_name=set_name, votes=1,
+                )
+                await session.execute(vote.on_conflict_do_update(
+                    index_elements=['user_id', 'tournament_id', 'set_id'],
+                    set_={'votes': SetVoteORM.votes + 1},
+                ))
+        AsyncCore.touch_tournament(tournament_id)
+        return RegResult.REGISTERED
 
 
     @staticmethod
@@ -160,13 +408,92 @@ class AsyncCore:
             return result.scalars().all()
 
     @staticmethod
-    async def get_tournament(tnmt_id: int):
+    async def get_pending_tournaments() -> list:
+        """Турниры, которым еще предстоит смена статуса по времени: (id, date, status)."""
+        async with read_session() as session:
+            result = await session.execute(
+                select(TournamentORM.id, TournamentORM.date, TournamentORM.status)
+                .where(TournamentORM.status.in_([TournamentStatus.PLANNED, TournamentStatus.UPCOMING]))
+            )
+            return result.all()
+
+    @staticmethod
+    async def start_tournaments(tournament_ids: list, min_players: int) -> tuple[list, list]:
+        """Запускает запланированные турниры пачкой: набравшие min_players переходят в UPCOMING,
+        остальные отменяются. Возвращает (started_ids, cancelled_ids)."""
+        players = (
+            select(func.count(RegistrationORM.id))
+            .where(RegistrationORM.tournament_id == TournamentORM.id,
+                   RegistrationORM.status == RegStatus.CONFIRMED)
+            .scalar_subquery()
+        )
         async with async_session() as session:
+            async with session.begin():
+                cancelled = await session.scalars(
+                    update(TournamentORM)
+                    .where(TournamentORM.id.in_(tournament_ids),
+                           TournamentORM.status == TournamentStatus.PLANNED,
+                           players < min_players)
+                    .values(status=TournamentStatus.CANCELLED)
+                    .returning(TournamentORM.id)
+                    .execution_options(synchronize_session=False)
+                )
+                cancelled = list(cancelled)
+                started = await session.scalars(
+                    update(TournamentORM)
+                    .where(TournamentORM.id.in_(tournament_ids),
+                           TournamentORM.status == TournamentStatus.PLANNED)
+                    .values(status=TournamentStatus.UPCOMING)
+                    .returning(TournamentORM.id)
+                    .execution_options(synchronize_session=False)
+                )
+                started = list(started)
+        for tournament_id in started + cancelled:
+            AsyncCore.touch_tournament(tournament_id)
+        return started, cancelled
+
+    @staticmethod
+    async def advance_tournaments(tournament_ids: list, from_status: TournamentStatus,
+                                  to_status: TournamentStatus) -> list:
+        """Переводит турниры из from_status в to_status одним UPDATE, возвращает id измененных."""
+        async with async_session() as session:
+            async with session.begin():
+                changed = list(await session.scalars(
+                    update(TournamentORM)
+                    .where(TournamentORM.id.in_(tournament_ids), TournamentORM.status == from_status)
+                    .values(status=to_status)
+                    .returning(TournamentORM.id)
+                    .execution_options(synchronize_session=False)
+                ))
+        for tournament_id in changed:
+            AsyncCore.touch_tournament(tournament_id)
+        return changed
+
+    @staticmethod
+    async def get_registrants(tournament_ids: list) -> dict:
+        """tg_id зарегистрированных игроков по турнирам: {tournament_id: [tg_id, ...]}."""
+        registrants = defaultdict(list)
+        if not tournament_ids:
+            return registrants
+        async with read_session() as session:
+            result = await session.execute(
+                select(RegistrationORM.tournament_id, UserORM.tg_id)
+                .join(UserORM, UserORM.id == RegistrationORM.user_id)
+                .where(RegistrationORM.tournament_id.in_(tournament_ids),
+                       RegistrationORM.status == RegStatus.CONFIRMED)
+            )
+            for tournament_id, tg_id in result:
+                registrants[tournament_id].append(tg_id)
+        return registrants
+
+    @staticmethod
+    async def get_tournament(tnmt_id: int):
+        async with read_session() as session:
             return await session.scalar(select(TournamentORM).where(TournamentORM.id == tnmt_id))
 
     @staticmethod   # Выгружват все турниры для конкретного пользователя по tg_id.
     async def get_user_tournaments(tg_id: BigInteger):
-        async with async_session() as session:
+        async with read_session() as session:
             # Сначала находим пользователя по tg_id
             user = await session.scalar(
                 select(UserORM).where(UserORM.tg_id == tg_id)
@@ -186,7 +513,7 @@ class AsyncCore:
 
     @staticmethod
     async def get_tournament_by_date(date: datetime):
-        async with async_session() as session:
+        async with read_session() as session:
             return await session.scalar(select(TournamentORM).where(TournamentORM.date == date))
 
     # @staticmethod
@@ -216,8 +543,7 @@ class AsyncCore:
     @staticmethod
     async def get_user_by_tg_id(tg_id: int):
         """Получает пользователя по Telegram ID."""
-        async with async_session() as session:
-            return await session.scalar(select(UserORM).where(UserORM.tg_id == tg_id))
+        return await AsyncCore.get_user_sts(tg_id)
     #
     # @staticmethod
     # async def register_user_for_tournament(user_id: int, tournament_id: int):
@@ -260,15 +586,99 @@ class AsyncCore:
             async with session.begin():
                 match = MatchORM(tournament_id=tournament_id, player1_id=player1_id, player2_id=player2_id, result='')
                 session.add(match)
+        AsyncCore.touch_tournament(tournament_id)
+
+    @staticmethod
+    async def add_round(tournament_id: int, round_no: int, pairs: list) -> list[MatchDTO]:
+        """Записывает все матчи тура одним INSERT. pairs - [(player1_id, player2_id | None, result)]."""
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    insert(MatchORM)
+                    .values([
+                        {'tournament_id': tournament_id, 'round': round_no,
+                         'player1_id': player1_id, 'player2_id': player2_id, 'result': result}
+                        for player1_id, player2_id, result in pairs
+                    ])
+                    .returning(MatchORM.id, MatchORM.tournament_id, MatchORM.round,
+                               MatchORM.player1_id, MatchORM.player2_id, MatchORM.result)
+                )
+                matches = [MatchDTO(*row) for row in result]
+        AsyncCore.touch_tournament(tournament_id)
+        return matches
+
+    @staticmethod
+    async def get_tournament_matches(tournament_id: int) -> list[MatchDTO]:
+        async with read_session() as session:
+            result = await session.execute(
+                select(MatchORM.id, MatchORM.tournament_id, MatchORM.round,
+                       MatchORM.player1_id, MatchORM.player2_id, MatchORM.result)
+                .where(MatchORM.tournament_id == tournament_id)
+                .order_by(MatchORM.round, MatchORM.id)
+            )
+            return [MatchDTO(*row) for row in result]
+
+    @staticmethod
+    async def get_tournament_players(tournament_id: int) -> list[int]:
+        """users.id игроков с подтвержденной регистрацией."""
+        async with read_session() as session:
+            result = await session.scalars(
+                select(RegistrationORM.user_id)
+                .where(RegistrationORM.tournament_id == tournament_id,
+                       RegistrationORM.status == RegStatus.CONFIRMED)
+                .order_by(RegistrationORM.id)
+            )
+            return list(result)
 
     @staticmethod
-    async def update_match_result(match_id: int, result: str):
-        """Обновляет результат матча."""
+    async def update_match_result(match_id: int, result: str, check=None):
+        """Обновляет результат матча. Возвращает (матч с новым результатом, прежний результат) или None.
+
+        check(match, result) вызывается до записи; исключение из него откатывает транзакцию.
+        """
         async with async_session() as session:
             async with session.begin():
                 match = await session.get(MatchORM, match_id)
-                if match:
-                    match.result = result
+                if not match:
+                    return None
+                previous = match.result
+                updated = MatchDTO(match.id, match.tournament_id, match.round,
+                                   match.player1_id, match.player2_id, result)
+                if check is not None:
+                    check(updated, result)
+                match.result = result
+        AsyncCore.touch_tournament(updated.tournament_id)
+        return updated, previous
+
+    @staticmethod
+    async def apply_results(results: list, check=None) -> list:
+        """Записывает пачку результатов [(match_id, result)] одной транзакцией (executemany).
+
+        Возвращает [(матч с новым результатом, прежний результат)] для найденных матчей.
+        check(match, result) проверяет каждый матч до записи; исключение откатывает всю пачку.
+        """
+        results = dict(results)
+        if not results:
+            return []
+        async with async_session() as session:
+            async with session.begin():
+                rows = await session.execute(
+                    select(MatchORM.id, MatchORM.tournament_id, MatchORM.round,
+                           MatchORM.player1_id, MatchORM.player2_id, MatchORM.result)
+                    .where(MatchORM.id.in_(results))
+                )
+                updated = [(MatchDTO(*row[:5], results[row.id]), row.result) for row in rows]
+                if check is not None:
+                    for match, _ in updated:
+                        check(match, match.result)
+                if updated:
+                    await session.execute(
+                        update(MatchORM),
+                        [{'id': match.id, 'result': match.result} for match, _ in updated],
+                    )
+        for tournament_id in {match.tournament_id for match, _ in updated}:
+            AsyncCore.touch_tournament(tournament_id)
+        return updated
 
     @staticmethod
     async def update_tournament_stats(user_id: int, tournament_id: int, wins: int, losses: int, draws: int):
@@ -282,70 +692,156 @@ class AsyncCore:
     @staticmethod
     async def get_user_stats(user_id: int):
         """Получает общую статистику пользователя."""
-        async with async_session() as session:
+        # Оба запроса в одной сессии: второе соединение из пула чтения (max_overflow=0)
+        # при нескольких одновременных вызовах привело бы к взаимному ожиданию до таймаута пула
+        async with read_session() as session:
             user = await session.get(UserORM, user_id)
             if user:
+                set_stats = await session.scalars(select(SetStatsORM).where(SetStatsORM.user_id == user_id))
                 return {
                     'username': user.username,
-                    'total_wins': user.total_wins,
-                    'total_losses': user.total_losses,
-                    'set_stats': await AsyncCore.get_user_set_stats(user_id)
+                    'wins': user.wins,
+                    'losses': user.losses,
+                    'set_stats': set_stats.all()
                 }
 
     @staticmethod
     async def get_user_set_stats(user_id: int):
         """Получает статистику пользователя по сетам."""
-        async with async_session() as session:
-            result = await session.execute(SetStatsORM.select().where(SetStatsORM.user_id == user_id))
+        async with read_session() as session:
+            result = await session.execute(select(SetStatsORM).where(SetStatsORM.user_id == user_id))
             return result.scalars().all()
 
     @staticmethod
-    async def get_top_players(limit: int = 10):
-        """Возвращает топ-10 игроков по количеству побед."""
-        async with async_session() as session:
-            result = await session.execute(
-                UserORM.select().order_by(UserORM.total_wins.desc()).limit(limit)
-            )
-            return result.scalars().all()
+    async def load_leaderboard() -> Leaderboard:
+        """Перечитывает рейтинг из users (при старте и при периодической сверке)."""
+        async with read_session() as session:
+            rows = await session.execute(select(UserORM.id, UserORM.username, UserORM.wins, UserORM.losses))
+            drift = leaderboard.load(LeaderboardEntry(*row) for row in rows)
+        if drift:
+            logger.info('Рейтинг сверен с БД, исправлено игроков: %s', drift)
+        return leaderboard
 
     @staticmethod
-    async def get_user_rank(user_id: int):
-        """Возвращает место пользователя в общем рейтинге."""
-        async with async_session() as session:
-            user = await session.get(UserORM, user_id)
-            if not user:
-                return None
+    async def get_top_players(limit: int = 10) -> list[LeaderboardEntry]:
+        """Возвращает топ игроков по победам, затем по винрейту."""
+        if not leaderboard.loaded:
+            await AsyncCore.load_leaderboard()
+        return leaderboard.top(limit)
 
-            result = await session.execute(
-                UserORM.select().where(UserORM.total_wins > user.total_wins)
-            )
-            count = result.scalar() or 0
-            return count + 1
+    @staticmethod
+    async def get_user_rank(user_id: int) -> int | None:
+        """Возвращает место пользователя (users.id) в общем рейтинге."""
+        if not leaderboard.loaded:
+            await AsyncCore.load_leaderboard()
+        return leaderboard.rank(user_id)
 
     @staticmethod
-    async def close_tournament(tournament_id: int):
-        """Закрывает турнир и фиксирует результаты."""
+    def leaderboard_size() -> int:
+        return len(leaderboard)
+
+    @staticmethod
+    def _tournament_results_stmt(tournament_id: int):
+        """Победы/поражения/ничьи каждого игрока турнира, посчитанные по матчам (бай - победа)."""
+        tournament_id = int(tournament_id)
+        result = MatchORM.result
+        as_player1 = select(
+            MatchORM.player1_id.label('user_id'),
+            case((result.in_(('player1_win', 'bye')), 1), else_=0).label('wins'),
+            case((result == 'player2_win', 1), else_=0).label('losses'),
+            case((result == 'draw', 1), else_=0).label('draws'),
+        ).where(MatchORM.tournament_id == tournament_id)
+        as_player2 = select(
+            MatchORM.player2_id.label('user_id'),
+            case((result == 'player2_win', 1), else_=0).label('wins'),
+            case((result == 'player1_win', 1), else_=0).label('losses'),
+            case((result == 'draw', 1), else_=0).label('draws'),
+        ).where(MatchORM.tournament_id == tournament_id, MatchORM.player2_id.is_not(None))
+        games = union_all(as_player1, as_player2).subquery()
+        return (
+            select(literal(tournament_id), games.c.user_id, func.sum(games.c.wins),
+                   func.sum(games.c.losses), func.sum(games.c.draws))
+            .group_by(games.c.user_id)
+        )
+
+    @staticmethod
+    async def close_tournament(tournament_id: int) -> bool:
+        """Закрывает турнир и переносит его итоги в общую статистику игроков.
+
+        Фиксированное число запросов независимо от числа игроков: итоги турнира
+        пересчитываются из матчей одним INSERT ... SELECT, затем одним UPDATE
+        добавляются в users и одним upsert - в set_stats по сыгранному сету.
+        Повторный вызов ничего не делает: статус меняется в той же транзакции.
+        """
+        tournament_id = int(tournament_id)
+        stats = TournamentStatsORM
         async with async_session() as session:
             async with session.begin():
-                tournament = await session.get(TournamentORM, tournament_id)
-                if tournament:
-                    tournament.status = 'closed'
-                    # Обновляем глобальную статистику пользователей по итогам турнира
-                    stats = await session.execute(
-                        TournamentStatsORM.select().where(TournamentStatsORM.tournament_id == tournament_id)
+                closed = await session.execute(
+                    update(TournamentORM)
+                    .where(TournamentORM.id == tournament_id,
+                           TournamentORM.status.in_((TournamentStatus.UPCOMING, TournamentStatus.ONGOING)))
+                    .values(status=TournamentStatus.COMPLETED)
+                    .returning(TournamentORM.id)
+                    .execution_options(synchronize_session=False)
+                )
+                if closed.scalar() is None:
+                    return False
+
+                await session.execute(delete(stats).where(stats.tournament_id == tournament_id))
+                await session.execute(
+                    insert(stats).from_select(
+                        ['tournament_id', 'user_id', 'wins', 'losses', 'draws'],
+                        AsyncCore._tournament_results_stmt(tournament_id),
                     )
-                    for stat in stats.scalars().all():
-                        user = await session.get(UserORM, stat.user_id)
-                        if user:
-                            user.total_wins += stat.wins
-                            user.total_losses += stat.losses
-                            session.add(user)
+                )
+
+                player_stats = select(stats).where(stats.tournament_id == tournament_id,
+                                                   stats.user_id == UserORM.id)
+                players = await session.execute(
+                    update(UserORM)
+                    .where(UserORM.id.in_(select(stats.user_id).where(stats.tournament_id == tournament_id)))
+                    .values(
+                        wins=UserORM.wins + player_stats.with_only_columns(stats.wins).scalar_subquery(),
+                        losses=UserORM.losses + player_stats.with_only_columns(stats.losses).scalar_subquery(),
+                    )
+                    .returning(UserORM.id, UserORM.username, UserORM.wins, UserORM.losses)
+                    .execution_options(synchronize_session=False)
+                )
+                players = players.all()
+
+                # Статистика по сету турнира; если сет не выбран, join не даст строк
+                set_results = insert(SetStatsORM).from_select(
+                    ['user_id', 'set_name', 'wins', 'losses'],
+                    select(stats.user_id, SetORM.set_name, stats.wins, stats.losses)
+                    .join(TournamentORM, TournamentORM.id == stats.tournament_id)
+                    .join(SetORM, SetORM.id == TournamentORM.winning_set_id)
+                    .where(stats.tournament_id == tournament_id)
+                )
+                await session.execute(
+                    set_results.on_conflict_do_update(
+                        index_elements=['user_id', 'set_name'],
+                        set_={'wins': SetStatsORM.wins + set_results.excluded.wins,
+                              'losses': SetStatsORM.losses + set_results.excluded.losses},
+                    )
+                )
+        # Победы/поражения изменились - профили в кэше устарели, места в рейтинге сдвинулись
+        AsyncCore.invalidate_user()
+        if leaderboard.loaded:
+            for row in players:
+                leaderboard.update(LeaderboardEntry(*row))
+        _publish('leaderboard')
+        AsyncCore.touch_tournament(tournament_id)
+        return True
 
     @staticmethod
     async def get_tournament_stats(tournament_id: int):
         """Получает статистику по турниру."""
-        async with async_session() as session:
+        async with read_session() as session:
             result = await session.execute(
-                TournamentStatsORM.select().where(TournamentStatsORM.tournament_id == tournament_id)
+                select(TournamentStatsORM).where(TournamentStatsORM.tournament_id == tournament_id)
             )
-            return result.scalars().all()
\ No newline at end of file
+            return result.scalars().all()
+
+# Отложенная запись профилей; фоновый сброс запускается в main.py (write_behind.run)
+write_behind = WriteBehind(AsyncCore._write_batch, interval=write_behind_interval, max_items=write_behind_max)
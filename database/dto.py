@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+
+
+# Лёгкие read-only объекты для кэшей и хендлеров: не держат сессию и не делают ленивых подгрузок.
+
+@dataclass(frozen=True, slots=True)
+class UserDTO:
+    id: int
+    tg_id: int
+    username: str
+    wins: int
+    losses: int
+
+    @classmethod
+    def from_orm(cls, user) -> 'UserDTO':
+        return cls(id=user.id, tg_id=user.tg_id, username=user.username, wins=user.wins, losses=user.losses)
+
+
+@dataclass(frozen=True, slots=True)
+class TournamentSlot:
+    id: int
+    name: str
+    date: object
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerCard:
+    user_id: int
+    tg_id: int | None
+    username: str
+    accounts: str  # ники МТГА через запятую
+
+
+@dataclass(frozen=True, slots=True)
+class SetVoteCard:
+    set_id: int
+    set_name: str
+    votes: int
+
+
+@dataclass(frozen=True, slots=True)
+class TournamentCard:
+    """Всё, что нужно для экрана турнира, собранное компактными запросами."""
+    id: int
+    name: str
+    date: object
+    status: object
+    winning_set_name: str | None
+    players: tuple[PlayerCard, ...]
+    top_sets: tuple[SetVoteCard, ...]
+    matches: tuple['MatchDTO', ...] = ()  # все туры; пусто, пока идет регистрация
+
+
+@dataclass(frozen=True, slots=True)
+class MatchDTO:
+    id: int
+    tournament_id: int
+    round: int
+    player1_id: int
+    player2_id: int | None
+    result: str
+
+
+@dataclass(frozen=True, slots=True)
+class LeaderboardEntry:
+    user_id: int
+    username: str
+    wins: int
+    losses: int
+
+    @property
+    def winrate(self) -> float:
+        games = self.wins + self.losses
+        return self.wins / games if games else 0.0
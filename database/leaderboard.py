@@ -0,0 +1,54 @@
+from bisect import bisect_left, insort
+
+from database.dto import LeaderboardEntry
+
+
+class Leaderboard:
+    """Общий рейтинг игроков в памяти: отсортированный список ключей (-победы, -винрейт, user_id).
+
+    Место игрока ищется бинпоиском за O(log n), топ-k - срез за O(k). Изменение
+    статистики переставляет один ключ, так что после закрытия турнира рейтинг не пересобирается.
+    Заполняется и обновляется из AsyncCore; периодически сверяется с БД через load().
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}  # user_id -> LeaderboardEntry
+        self.loaded = False
+
+    @staticmethod
+    def _key(entry: LeaderboardEntry) -> tuple:
+        return -entry.wins, -entry.winrate, entry.user_id
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries) -> int:
+        """Заменяет рейтинг целиком. Возвращает число игроков, расходившихся с новым снимком."""
+        entries = {entry.user_id: entry for entry in entries}
+        drift = sum(1 for user_id in entries.keys() | self._entries.keys()
+                    if entries.get(user_id) != self._entries.get(user_id))
+        self._entries = entries
+        self._keys = sorted(self._key(entry) for entry in entries.values())
+        self.loaded = True
+        return drift
+
+    def update(self, entry: LeaderboardEntry):
+        previous = self._entries.get(entry.user_id)
+        if previous == entry:
+            return
+        if previous is not None:
+            del self._keys[bisect_left(self._keys, self._key(previous))]
+        insort(self._keys, self._key(entry))
+        self._entries[entry.user_id] = entry
+
+    def rank(self, user_id: int) -> int | None:
+        """Место игрока (1 - лучший); при равных победах и винрейте места делятся."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        # Ключ без user_id встает перед всеми равными игроками - слева только те, кто строго выше
+        return bisect_left(self._keys, self._key(entry)[:2]) + 1
+
+    def top(self, limit: int) -> list[LeaderboardEntry]:
+        return [self._entries[key[2]] for key in self._keys[:limit]]
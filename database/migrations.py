@@ -0,0 +1,191 @@
+"""Миграции схемы для уже существующей базы (tg_bot_db.sqlite3).
+
+create_all создает только отсутствующие таблицы, поэтому новые индексы и ограничения
+на старые таблицы накатываются здесь. Номер ревизии хранится в PRAGMA user_version.
+Нужны только SQLite: базы PostgreSQL заводятся с нуля полной схемой.
+
+Проверка планов горячих запросов: python -m database.migrations [путь_к_базе]
+"""
+import sys
+
+from sqlalchemy import select
+
+from database.models import *
+from datetime import datetime
+
+
+def _migration_1(conn):
+    """Индексы горячих выборок и уникальные ключи регистраций/голосов/слотов турниров."""
+    # Турниры-дубли на один слот: сначала переносим ссылки на самый ранний и удаляем остальные -
+    # иначе игрок, записанный в оба дубля, после переноса получил бы две регистрации на один турнир
+    for table, column in (('registrations', 'tournament_id'), ('set_votes', 'tournament_id'),
+                          ('matches', 'tournament_id'), ('tournament_stats', 'tournament_id'),
+                          ('tournament_sets', 'tournament_id')):
+        conn.exec_driver_sql(f"""
+            UPDATE OR IGNORE {table} SET {column} = (
+                SELECT MIN(t2.id) FROM tournaments t1 JOIN tournaments t2 ON t2.date = t1.date
+                WHERE t1.id = {table}.{column}
+            )""")
+    # Сет, выбранный для обоих дублей, уже есть у оставшегося турнира (ключ - PRIMARY KEY, строка не перенеслась)
+    conn.exec_driver_sql("""
+        DELETE FROM tournament_sets WHERE tournament_id NOT IN (SELECT MIN(id) FROM tournaments GROUP BY date)""")
+    conn.exec_driver_sql("""
+        DELETE FROM tournaments WHERE id NOT IN (SELECT MIN(id) FROM tournaments GROUP BY date)""")
+
+    # Затем схлопываем дубли регистраций и голосов, которые мог оставить check-then-insert
+    # или перенос выше; голоса одного игрока за один сет суммируются
+    conn.exec_driver_sql("""
+        DELETE FROM registrations WHERE id NOT IN (
+            SELECT MIN(id) FROM registrations GROUP BY user_id, tournament_id
+        )""")
+    conn.exec_driver_sql("""
+        UPDATE set_votes SET votes = (
+            SELECT SUM(sv.votes) FROM set_votes sv
+            WHERE sv.user_id = set_votes.user_id
+              AND sv.tournament_id = set_votes.tournament_id
+              AND sv.set_id = set_votes.set_id
+        ) WHERE id IN (SELECT MIN(id) FROM set_votes GROUP BY user_id, tournament_id, set_id)""")
+    conn.exec_driver_sql("""
+        DELETE FROM set_votes WHERE id NOT IN (
+            SELECT MIN(id) FROM set_votes GROUP BY user_id, tournament_id, set_id
+        )""")
+
+    for ddl in (
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_registrations_user_tournament ON registrations (user_id, tournament_id)",
+        "CREATE INDEX IF NOT EXISTS ix_registrations_tournament ON registrations (tournament_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_set_votes_user_tournament_set ON set_votes (user_id, tournament_id, set_id)",
+        "CREATE INDEX IF NOT EXISTS ix_set_votes_tournament_set ON set_votes (tournament_id, set_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_tournaments_date ON tournaments (date)",
+        "CREATE INDEX IF NOT EXISTS ix_mtg_accounts_user_id ON mtg_accounts (user_id)",
+    ):
+        conn.exec_driver_sql(ddl)
+
+
+def _migration_2(conn):
+    """Старые регистрации и голоса хранили tg_id в user_id - переводим их на users.id."""
+    for table in ('registrations', 'set_votes'):
+        conn.exec_driver_sql(f"""
+            UPDATE OR IGNORE {table} SET user_id = (SELECT id FROM users WHERE users.tg_id = {table}.user_id)
+            WHERE user_id NOT IN (SELECT id FROM users) AND user_id IN (SELECT tg_id FROM users)""")
+
+
+def _migration_3(conn):
+    """Матчи: номер тура и nullable player2_id для бая. SQLite не умеет менять NOT NULL - пересобираем таблицу."""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(matches)")}
+    if 'round' not in columns:
+        conn.exec_driver_sql("""
+            CREATE TABLE matches_new (
+                id INTEGER NOT NULL,
+                tournament_id INTEGER NOT NULL,
+                round INTEGER DEFAULT '1' NOT NULL,
+                player1_id INTEGER NOT NULL,
+                player2_id INTEGER,
+                result VARCHAR(256) NOT NULL,
+                created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+                updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+                PRIMARY KEY (id),
+                FOREIGN KEY(tournament_id) REFERENCES tournaments (id),
+                FOREIGN KEY(player1_id) REFERENCES users (id),
+                FOREIGN KEY(player2_id) REFERENCES users (id)
+            )""")
+        conn.exec_driver_sql("""
+            INSERT INTO matches_new (id, tournament_id, player1_id, player2_id, result, created_at, updated_at)
+            SELECT id, tournament_id, player1_id, player2_id, result, created_at, updated_at FROM matches""")
+        conn.exec_driver_sql("DROP TABLE matches")
+        conn.exec_driver_sql("ALTER TABLE matches_new RENAME TO matches")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_matches_tournament_round ON matches (tournament_id, round)")
+
+
+def _migration_4(conn):
+    """Статистика по сетам: одна строка на (игрок, сет), чтобы закрытие турнира делало upsert."""
+    conn.exec_driver_sql("""
+        UPDATE set_stats SET
+            wins = (SELECT SUM(s.wins) FROM set_stats s
+                    WHERE s.user_id = set_stats.user_id AND s.set_name = set_stats.set_name),
+            losses = (SELECT SUM(s.losses) FROM set_stats s
+                      WHERE s.user_id = set_stats.user_id AND s.set_name = set_stats.set_name)
+        WHERE id IN (SELECT MIN(id) FROM set_stats GROUP BY user_id, set_name)""")
+    conn.exec_driver_sql("""
+        DELETE FROM set_stats WHERE id NOT IN (SELECT MIN(id) FROM set_stats GROUP BY user_id, set_name)""")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS uq_set_stats_user_set ON set_stats (user_id, set_name)")
+
+
+# Порядок важен: ревизия N применяется, если user_version < N
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+]
+
+
+def run_migrations(conn):
+    """Накатывает недостающие ревизии. Вызывается через conn.run_sync после create_all."""
+    if conn.dialect.name != 'sqlite':
+        # Ревизии чинят старые SQLite-базы; в PostgreSQL схема сразу создается create_all целиком
+        return
+    version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    for revision, migration in enumerate(MIGRATIONS, start=1):
+        if revision > version:
+            migration(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {revision}")
+
+
+def hot_queries():
+    """Запросы с горячих путей бота, которые не должны деградировать до полного скана."""
+    from database.core import AsyncCore
+
+    return {
+        'registration by user+tournament': select(RegistrationORM)
+            .where(RegistrationORM.user_id == 1, RegistrationORM.tournament_id == 1),
+        'set vote by user+tournament+set': select(SetVoteORM)
+            .where(SetVoteORM.user_id == 1, SetVoteORM.tournament_id == 1, SetVoteORM.set_id == 1),
+        'tournaments by dates': select(TournamentORM)
+            .where(TournamentORM.date.in_([datetime(2030, 1, 5, 12), datetime(2030, 1, 5, 18)])),
+        'tournament by date': select(TournamentORM).where(TournamentORM.date == datetime(2030, 1, 5, 12)),
+        'user tournaments': select(TournamentORM).join(RegistrationORM).where(RegistrationORM.user_id == 1),
+        'card players': select(RegistrationORM.user_id, UserORM.username, MtgORM.username)
+            .outerjoin(UserORM, UserORM.id == RegistrationORM.user_id)
+            .outerjoin(MtgORM, MtgORM.user_id == UserORM.id)
+            .where(RegistrationORM.tournament_id == 1),
+        'card top sets': AsyncCore._top_sets_stmt(1, 3),
+    }
+
+
+def explain_hot_queries(conn) -> dict:
+    """EXPLAIN QUERY PLAN для hot_queries(): {имя: [строки плана]}."""
+    plans = {}
+    for name, stmt in hot_queries().items():
+        compiled = stmt.compile(conn, compile_kwargs={'render_postcompile': True})
+        params = tuple(compiled.params[key] for key in compiled.positiontup)
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        plans[name] = [row[-1] for row in rows]
+    return plans
+
+
+def full_scans(plans: dict) -> dict:
+    """Оставляет только запросы, в плане которых есть SCAN таблицы (без индекса)."""
+    return {
+        name: steps for name, steps in plans.items()
+        if any(step.startswith('SCAN ') and 'USING' not in step for step in steps)
+    }
+
+
+if __name__ == '__main__':
+    from sqlalchemy import create_engine
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tg_bot_db.sqlite3'
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        run_migrations(conn)
+        plans = explain_hot_queries(conn)
+    for name, steps in plans.items():
+        print(f'{name}:')
+        for step in steps:
+            print(f'    {step}')
+    scans = full_scans(plans)
+    if scans:
+        print(f'FAIL: full table scan in {", ".join(scans)}')
+        sys.exit(1)
+    print('OK: all hot queries use indexes')
@@ -1,7 +1,7 @@
 import datetime
 import enum
 
-from sqlalchemy import BigInteger, ForeignKey, func, String, select
+from sqlalchemy import BigInteger, ForeignKey, func, String, select, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, Relationship, mapped_column
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -27,6 +27,14 @@ class RegStatus(enum.Enum):
     CANCELLED = "cancelled"
 
 
+class RegResult(enum.Enum):
+    """Итог попытки регистрации (AsyncCore.register_user_for_tournament), в БД не хранится."""
+    REGISTERED = "registered"
+    ALREADY_REGISTERED = "already_registered" # игрок уже записан на этот турнир
+    CLOSED = "closed" # турнир уже не в статусе PLANNED (или его нет)
+    UNKNOWN_SET = "unknown_set" # сета нет в справочнике (например, устаревшая кнопка)
+
+
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
@@ -96,7 +104,7 @@ class MtgORM(Base):
     username: Mapped[str] = mapped_column(String, nullable=False)
 
     # Relationships
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False, index=True)
     user: Mapped['UserORM'] = Relationship('UserORM', back_populates='accounts')
 
 
@@ -105,7 +113,7 @@ class TournamentORM(Base):
 
     id: Mapped[int_pk]
     name: Mapped[str_256]
-    date: Mapped[datetime.datetime]
+    date: Mapped[datetime.datetime] = mapped_column(unique=True, index=True)  # один турнир на слот
     status: Mapped[TournamentStatus] = mapped_column(default=TournamentStatus.PLANNED)
     created_at: Mapped[created_at]
     updated_at: Mapped[updated_at]
@@ -122,6 +130,10 @@ class TournamentORM(Base):
 
 class SetVoteORM(Base):
     __tablename__ = 'set_votes'
+    __table_args__ = (
+        Index('ix_set_votes_tournament_set', 'tournament_id', 'set_id'),  # подсчет голосов по турниру
+        Index('uq_set_votes_user_tournament_set', 'user_id', 'tournament_id', 'set_id', unique=True),
+    )
 
     id: Mapped[int_pk]
     tournament_id: Mapped[int] = mapped_column(ForeignKey('tournaments.id'), nullable=False)
@@ -162,6 +174,11 @@ class TournamentSetORM(Base):
 
 class RegistrationORM(Base):
     __tablename__ = 'registrations'
+    __table_args__ = (
+        # Одна регистрация на игрока в турнире; индекс также покрывает поиск турниров игрока
+        Index('uq_registrations_user_tournament', 'user_id', 'tournament_id', unique=True),
+        Index('ix_registrations_tournament', 'tournament_id'),
+    )
 
     id: Mapped[int_pk]
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
@@ -177,12 +194,16 @@ class RegistrationORM(Base):
 
 class MatchORM(Base):
     __tablename__ = 'matches'
+    __table_args__ = (
+        Index('ix_matches_tournament_round', 'tournament_id', 'round'),
+    )
 
     id: Mapped[int_pk]
     tournament_id: Mapped[int] = mapped_column(ForeignKey('tournaments.id'))
+    round: Mapped[int] = mapped_column(default=1, server_default='1')
     player1_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
-    player2_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
-    result: Mapped[str_256]
+    player2_id: Mapped[int | None] = mapped_column(ForeignKey('users.id'), nullable=True)  # None - бай
+    result: Mapped[str_256]  # '' - не сыгран, player1_win / player2_win / draw / bye
     created_at: Mapped[created_at]
     updated_at: Mapped[updated_at]
 
@@ -194,6 +215,9 @@ class MatchORM(Base):
 
 class SetStatsORM(Base):
     __tablename__ = 'set_stats'
+    __table_args__ = (
+        Index('uq_set_stats_user_set', 'user_id', 'set_name', unique=True),  # upsert при закрытии турнира
+    )
 
     id: Mapped[int_pk]
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
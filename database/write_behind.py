@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from collections import Counter
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько сбросов подряд элемент может не записаться, прежде чем его выбросят из очереди
+MAX_FAILURES = 5
+
+
+class WriteBehind:
+    """Очередь отложенной записи мелких идемпотентных изменений.
+
+    Профили пользователей (tg_id -> username, побеждает последнее значение) копятся в памяти
+    и уходят в БД одним upsert раз в interval секунд или как только накопится max_items.
+    Саму запись делает writer(users) - его подключает AsyncCore. Голоса за сеты сюда не идут:
+    они пишутся в транзакции регистрации.
+    """
+
+    def __init__(self, writer, interval: float, max_items: int):
+        self._writer = writer
+        self.interval = interval
+        self.max_items = max_items
+        self._users = {}
+        self._writing = {}  # профили пачки, которая пишется прямо сейчас
+        self._failures = Counter()  # tg_id -> неудачных сбросов подряд
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+
+    def __len__(self):
+        return len(self._users)
+
+    def add_user(self, tg_id: int, username: str):
+        self._users[tg_id] = username
+        self._check_size()
+
+    def pending_username(self, tg_id: int) -> str | None:
+        """Username, который еще не записан в БД, если он есть."""
+        if tg_id in self._users:
+            return self._users[tg_id]
+        return self._writing.get(tg_id)
+
+    def _check_size(self):
+        if len(self) >= self.max_items:
+            self._full.set()
+
+    async def flush(self):
+        """Записывает накопленное одной транзакцией.
+
+        Если пачка не записалась, пишет ее по одному профилю: один плохой профиль не держит
+        остальные. Не записавшиеся профили возвращаются в очередь, а после MAX_FAILURES
+        неудач подряд выбрасываются с ошибкой в логе.
+        """
+        async with self._lock:
+            if not len(self):
+                return
+            users = self._users
+            self._users = {}
+            self._writing = users
+            try:
+                await self._writer(users)
+            except Exception:
+                logger.exception('Пачка отложенных профилей (%s) не записалась, пишем по одному', len(users))
+                await self._write_each(users)
+            else:
+                if self._failures:
+                    for tg_id in users:
+                        self._failures.pop(tg_id, None)
+            finally:
+                self._writing = {}
+
+    async def _write_each(self, users: dict):
+        for tg_id, username in users.items():
+            try:
+                await self._writer({tg_id: username})
+            except Exception as error:
+                self._failures[tg_id] += 1
+                if self._failures[tg_id] >= MAX_FAILURES:
+                    del self._failures[tg_id]
+                    logger.error('Профиль %s не записался %s раз подряд, выбрасываем: %s', tg_id, MAX_FAILURES, error)
+                    continue
+                # Более свежий username, пришедший во время записи, не затираем
+                self._users.setdefault(tg_id, username)
+            else:
+                self._failures.pop(tg_id, None)
+
+    async def run(self):
+        """Фоновая задача: сбрасывает очередь по таймеру или по заполнению."""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Не удалось записать отложенные изменения, повторим позже')
@@ -0,0 +1,106 @@
+from database.core import AsyncCore
+from database.models import TournamentStatus
+from keyboards.main_kb import tournament_kb
+from services.pairing import Standings, PLAYER1_WIN, PLAYER2_WIN, DRAW, BYE, NOT_PLAYED
+from utils import TTLCache
+
+
+# Отрисованные карточки турниров: tournament_id -> (версия, карточка, {registered: (text, markup)}).
+# Пока версия турнира в AsyncCore не изменилась, повторные показы не ходят в БД и не рисуют заново.
+card_cache = TTLCache(maxsize=256, ttl=3600)
+
+
+# Заголовки статусов на экране турнира
+STATUS_TITLES = {
+    TournamentStatus.PLANNED: 'Запланирован',
+    TournamentStatus.UPCOMING: 'Идет драфт',
+    TournamentStatus.ONGOING: 'Идут игры',
+    TournamentStatus.COMPLETED: 'Завершен',
+    TournamentStatus.CANCELLED: 'Отменен',
+}
+# Счет матча на экране турнира по MatchORM.result
+MATCH_SCORES = {PLAYER1_WIN: '1:0', PLAYER2_WIN: '0:1', DRAW: '½:½', NOT_PLAYED: 'играют'}
+
+
+def render_card(card, registered: bool):
+    """Текст и клавиатура экрана турнира для зарегистрированного/незарегистрированного игрока."""
+    markup = tournament_kb(card.id, card.status, registered)
+    # Собираем информацию о каждом зарегистрированном игроке: имя и его ники МТГА
+    players_info = "\n".join(f"{player.username} ({player.accounts})" for player in card.players)
+    header = (
+        f"Турнир: {card.name}\n"
+        f"Дата: {card.date}\n"
+        f"Статус: {STATUS_TITLES[card.status]}\n\n"
+    )
+    if card.status == TournamentStatus.PLANNED:
+        # Топ-3 сета уже отсортированы и обрезаны в SQL
+        top_sets_info = "\n".join(f"{sv.set_name}: {sv.votes} голосов" for sv in card.top_sets)
+        text = (
+            f"{header}"
+            f"Зарегистрированные игроки ({len(card.players)}):\n{players_info}\n\n"
+            f"Топ-3 сета в голосовании:\n{top_sets_info}"
+        )
+        return text, markup
+    if card.status == TournamentStatus.CANCELLED or not card.matches:
+        text = (
+            f"{header}"
+            f"Игроки ({len(card.players)}):\n{players_info}\n\n"
+            f"Сет: {card.winning_set_name or 'Сет еще не определен'}"
+        )
+        return text, markup
+
+    names = {player.user_id: player.username for player in card.players}
+    current_round = card.matches[-1].round
+    pairings = "\n".join(_match_line(match, names) for match in card.matches if match.round == current_round)
+    # Таблица считается по матчам карточки: Standings пересчитывается раз на версию турнира
+    table = Standings.from_matches(card.id, names, card.matches)
+    standings_info = "\n".join(
+        f"{place}. {names.get(player.user_id, 'Unknown User')}: {player.points} очк. "
+        f"({player.wins}-{player.losses}-{player.draws})"
+        for place, player in enumerate(table.ranking(), start=1)
+    )
+    round_title = 'Последний тур' if card.status == TournamentStatus.COMPLETED else 'Тур'
+    text = (
+        f"{header}"
+        f"Сет: {card.winning_set_name or 'Сет еще не определен'}\n\n"
+        f"{round_title} {current_round}:\n{pairings}\n\n"
+        f"Таблица:\n{standings_info}"
+    )
+    return text, markup
+
+
+def _match_line(match, names: dict) -> str:
+    player1 = names.get(match.player1_id, 'Unknown User')
+    if match.player2_id is None or match.result == BYE:
+        return f"{player1} - бай"
+    player2 = names.get(match.player2_id, 'Unknown User')
+    return f"{player1} - {player2}: {MATCH_SCORES.get(match.result, match.result)}"
+
+
+async def get_card(tournament_id: int):
+    """Карточка турнира из кэша, если версия не менялась, иначе свежая из БД."""
+    tournament_id = int(tournament_id)
+    # Версию берем до запроса: если турнир изменится во время чтения, запись сразу окажется устаревшей
+    version = AsyncCore.tournament_version(tournament_id)
+    entry = card_cache.get(tournament_id)
+    if entry is not None and entry[0] == version:
+        return entry
+    card = await AsyncCore.tournament_card(tournament_id)
+    if card is None:
+        return None
+    entry = (version, card, {})
+    card_cache.set(tournament_id, entry)
+    return entry
+
+
+async def tournament_screen(tournament_id: int, tg_id: int):
+    """Возвращает (card, registered, text, markup) для экрана турнира."""
+    entry = await get_card(tournament_id)
+    if entry is None:
+        return None
+    _, card, rendered = entry
+    registered = any(player.tg_id == tg_id for player in card.players)
+    if registered not in rendered:
+        rendered[registered] = render_card(card, registered)
+    text, markup = rendered[registered]
+    return card, registered, text, markup
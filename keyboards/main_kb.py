@@ -2,7 +2,9 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMar
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 
 
-from utils import nearest_weekend
+from utils import nearest_weekend, TTLCache
+from database.core import AsyncCore
+from database.models import TournamentStatus
 
 # start = ReplyKeyboardMarkup(keyboard=[
 #     [KeyboardButton(text='Найти игру'),
@@ -27,6 +29,72 @@ start_kb = InlineKeyboardMarkup(inline_keyboard=[
 ])
 
 
+# Фабрика клавиатур: готовые InlineKeyboardMarkup кэшируются по ключу содержимого
+# (id и названия турниров, версия справочника сетов, флаг регистрации), так что одинаковые
+# для всех пользователей клавиатуры не собираются заново на каждый callback.
+keyboard_cache = TTLCache(maxsize=512, ttl=24 * 3600)
+
+
+def _cached(key, build) -> InlineKeyboardMarkup:
+    markup = keyboard_cache.get(key)
+    if markup is None:
+        markup = build()
+        keyboard_cache.set(key, markup)
+    return markup
+
+
+def tournaments_kb(tournaments) -> InlineKeyboardMarkup:
+    """Список турниров недели + Назад."""
+    items = tuple((t.id, t.name) for t in tournaments)
+
+    def build():
+        keyboard = InlineKeyboardBuilder()
+        for tournament_id, tournament_name in items:
+            keyboard.button(text=f'{tournament_name}', callback_data=f'tournament_{tournament_id}')
+        keyboard.button(text='Назад', callback_data='back_to_start')
+        return keyboard.adjust(2).as_markup()
+
+    return _cached(('tournaments', items), build)
+
+
+def tournament_kb(tournament_id: int, status: TournamentStatus, registered: bool) -> InlineKeyboardMarkup:
+    """Кнопки экрана турнира в зависимости от статуса и регистрации пользователя."""
+    def build():
+        keyboard = InlineKeyboardBuilder()
+        if status != TournamentStatus.PLANNED:
+            # Регистрация закрыта: паринги и таблицу в карточке обновляет доска, из кнопок - только выход
+            keyboard.button(text='Назад', callback_data='find_game')
+            return keyboard.as_markup()
+        if registered:
+            keyboard.button(text='Отменить регистрацию', callback_data=f'cancel_registration_{tournament_id}')
+            keyboard.button(text='Изменить выбор сета', callback_data=f'change_set_{tournament_id}')
+            keyboard.button(text='Назад', callback_data='find_game')
+            return keyboard.adjust(2).as_markup()
+        keyboard.row(
+            InlineKeyboardButton(text='Зарегистрироваться', callback_data=f'reg_{tournament_id}')
+        )
+        # "Обновить" не нужна: открытую карточку обновляет services/board.py
+        keyboard.row(
+            InlineKeyboardButton(text='Назад', callback_data='find_game')
+        )
+        return keyboard.as_markup()
+
+    return _cached(('tournament', tournament_id, status, registered), build)
+
+
+def set_vote_kb() -> InlineKeyboardMarkup:
+    """Голосование за сет: одинакова для всех, собирается один раз на версию справочника."""
+    catalog = AsyncCore.get_set_catalog()
+
+    def build():
+        keyboard = InlineKeyboardBuilder()
+        for set_info in catalog:
+            keyboard.button(text=set_info.name, callback_data=f'set_{set_info.id}')
+        keyboard.button(text='назад', callback_data='find_game')
+        return keyboard.adjust(3).as_markup()
+
+    return _cached(('set_vote', catalog.version), build)
+
 
 #
 # async def nearest_game():
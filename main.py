@@ -1,44 +1,167 @@
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 import asyncio
 import logging
-import ast
-from dotenv import load_dotenv
-import os
+from config import (token, admin_id, telegram_api_url, bot_mode, workers, callback_debounce,
+                    webhook_url, webhook_host, webhook_port, webhook_path, webhook_secret,
+                    metrics_host, metrics_port, metrics_log_interval)
 from handlers.globe import router
 from handlers.back import back_router
-from database.core import AsyncCore
+from database.core import AsyncCore, write_behind, engine, read_engine, invalidation_listeners
+from middlewares.metrics import metrics, MetricsMiddleware, HandlerNameMiddleware
+from middlewares.throttling import CallbackDebounceMiddleware, UserLockIsolation, EditDedupMiddleware
+from services.scheduler import week_schedule, lifecycle, reconcile_leaderboard
+from services.fsm_storage import make_storage
+from services.workers import Front
+from services.sender import sender, Priority
+from services.board import board, UnwatchMiddleware
 
 
-load_dotenv()
+session = AiohttpSession(api=TelegramAPIServer.from_base(telegram_api_url)) if telegram_api_url else None
+bot = Bot(token=token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+storage = make_storage()
+# Апдейты одного пользователя обрабатываются по очереди; Redis сериализует их еще и между процессами бота
+isolation = storage.create_isolation() if hasattr(storage, 'create_isolation') else UserLockIsolation()
+# FSM-мидлварь подключаем ниже сами: метрики и отсев двойных нажатий должны стоять перед очередью пользователя
+dp = Dispatcher(storage=storage, events_isolation=isolation, disable_fsm=True)
+dp.include_routers(router, back_router)
 
-token = os.getenv('TOKEN')
-admin_id = tuple(ast.literal_eval(os.getenv('ADMIN_ID')))
+# Время и запросы к БД на каждый апдейт, с разбивкой по хендлерам
+dp.update.outer_middleware(MetricsMiddleware(metrics))
+# Двойные нажатия: повтор кнопки гасим сразу, не ставя в очередь,
+# а правку сообщения на тот же текст с той же клавиатурой в Telegram не отправляем
+if callback_debounce:
+    dp.update.outer_middleware(CallbackDebounceMiddleware(callback_debounce))
+dp.update.outer_middleware(dp.fsm)
+dp.callback_query.outer_middleware(UnwatchMiddleware(board))
+bot.session.middleware(EditDedupMiddleware())
+for observer in (router.message, router.callback_query, back_router.message, back_router.callback_query):
+    observer.middleware(HandlerNameMiddleware())
+metrics.instrument(engine, read_engine)
+metrics.track_cache('user', AsyncCore.cache_stats)
 
-bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
-dp.include_routers(router, back_router)
+
+# Исходящие рассылки идут через очередь с лимитами Telegram, а не циклом по одному сообщению
+sender.bot = bot
 
 
 async def start_bot(bot: Bot):
     for element in admin_id:
-        await bot.send_message(chat_id=element, text='Бот запущен!')
+        sender.send_message(element, 'Бот запущен!')
+
+
+async def notify(tg_id: int, text: str):
+    # Старт/отмена турнира и начало игр обгоняют в очереди анонсы; ошибки доставки пишет sender
+    sender.send_message(tg_id, text, Priority.URGENT)
 
 dp.startup.register(start_bot)
 
 
+async def run_polling():
+    # Вебхук, оставшийся от запуска в режиме webhook, не дал бы получать апдейты getUpdates;
+    # апдейты, накопившиеся за время перезапуска, не выбрасываем
+    await bot.delete_webhook(drop_pending_updates=False)
+    await dp.start_polling(bot)
+
+
+async def register_webhook():
+    if webhook_url:
+        # Апдейты, пришедшие пока бот лежал, Telegram доставит после регистрации, а не выбросит
+        await bot.set_webhook(f'{webhook_url}{webhook_path}', secret_token=webhook_secret,
+                              allowed_updates=dp.resolve_used_update_types())
+
+
+async def run_webhook():
+    """Принимает апдейты POST-запросами от Telegram на aiohttp-сервере вместо опроса getUpdates."""
+    await register_webhook()
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=webhook_secret).register(app, path=webhook_path)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=webhook_host, port=webhook_port).start()
+    logging.info('Webhook слушает %s:%s%s', webhook_host, webhook_port, webhook_path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
 async def main():
+    background = []
+    try:
+        await AsyncCore.create_tables()
+        await AsyncCore.load_set_catalog()
+        await AsyncCore.load_leaderboard()
+        # Переходы статусов турниров по времени (старт/отмена, начало игр)
+        lifecycle.notify = notify
+        await lifecycle.load()
+        # Турниры выходных создаются здесь и в полночь, а не в обработчиках
+        await week_schedule.refresh()
+        background.append(asyncio.create_task(sender.run()))
+        background.append(asyncio.create_task(board.run()))
+        background.append(asyncio.create_task(week_schedule.run()))
+        background.append(asyncio.create_task(lifecycle.run()))
+        background.append(asyncio.create_task(reconcile_leaderboard()))
+        background.append(asyncio.create_task(write_behind.run()))
+        if metrics_port:
+            background.append(asyncio.create_task(metrics.serve(metrics_host, metrics_port)))
+        if metrics_log_interval:
+            background.append(asyncio.create_task(metrics.log_summary(metrics_log_interval)))
+        await (run_webhook() if bot_mode == 'webhook' else run_polling())
+    finally:
+        # Уже поставленные уведомления успеваем отправить, пока работает sender.run
+        await sender.drain(5)
+        for task in background:
+            task.cancel()
+        # Профили и голоса, еще не записанные фоновой задачей
+        await AsyncCore.flush_writes()
+        await bot.session.close()
+
+
+async def main_front():
+    """WORKERS > 1: этот процесс только принимает апдейты и ведет турниры, обрабатывают воркеры."""
+    front = Front(bot, workers)
+    background = []
     try:
         await AsyncCore.create_tables()
-        await dp.start_polling(bot, skip_updates=True)
+        lifecycle.notify = notify
+        await lifecycle.load()
+        await week_schedule.refresh()
+        front.start()
+        # Закрытие турнира здесь сбрасывает карточки и рейтинг у всех воркеров
+        invalidation_listeners.append(front.broadcast)
+        background.append(asyncio.create_task(sender.run()))
+        background.append(asyncio.create_task(week_schedule.run()))
+        background.append(asyncio.create_task(lifecycle.run()))
+        background.append(asyncio.create_task(front.relay()))
+        # Запросы планировщика фронта; метрики хендлеров отдают воркеры на следующих портах
+        if metrics_port:
+            background.append(asyncio.create_task(metrics.serve(metrics_host, metrics_port)))
+        await start_bot(bot)
+        if bot_mode == 'webhook':
+            await register_webhook()
+            await front.serve_webhook(webhook_host, webhook_port, webhook_path, webhook_secret)
+        else:
+            # Апдейты, накопившиеся за время перезапуска, не выбрасываем
+            await bot.delete_webhook(drop_pending_updates=False)
+            await front.poll(dp.resolve_used_update_types())
     finally:
+        await sender.drain(5)
+        for task in background:
+            task.cancel()
+        front.stop()
         await bot.session.close()
 
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO) # Подключение логирования
     try:
-        asyncio.run(main())
+        asyncio.run(main_front() if workers > 1 else main())
     except KeyboardInterrupt:
         print('Бот выключен')
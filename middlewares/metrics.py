@@ -0,0 +1,223 @@
+"""Метрики обработки апдейтов: время хендлеров и запросы к БД на апдейт.
+
+MetricsMiddleware (outer, на dp.update) замеряет весь апдейт, HandlerNameMiddleware
+(inner, на message/callback_query роутеров) подписывает его именем сработавшего хендлера,
+а события SQLAlchemy добавляют в текущий апдейт число запросов и время в БД.
+Снимок отдается в текстовом формате Prometheus (GET /metrics) и периодически пишется в лог.
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class UpdateStats:
+    """Счетчики одного апдейта; живут в contextvar на время его обработки."""
+    __slots__ = ('handler', 'queries', 'db_time')
+
+    def __init__(self):
+        self.handler = 'unhandled'
+        self.queries = 0
+        self.db_time = 0.0
+
+
+current_update: ContextVar[UpdateStats | None] = ContextVar('current_update', default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self.latency = {}  # handler -> Histogram секунд
+        self.queries = {}  # handler -> Histogram запросов на апдейт
+        self.db_time = {}  # handler -> секунд в БД всего
+        self.errors = {}  # handler -> апдейтов с исключением
+        self.background_queries = 0  # запросы вне апдейтов (планировщик, write-behind)
+        self.caches = {}  # имя кэша -> stats() со счетчиками size/hits/misses/hit_rate
+
+    def track_cache(self, name: str, stats):
+        """Добавляет счетчики кэша (например, AsyncCore.cache_stats) в /metrics и сводку в логе."""
+        self.caches[name] = stats
+
+    def observe(self, stats: UpdateStats, elapsed: float, failed: bool):
+        handler = stats.handler
+        if handler not in self.latency:
+            self.latency[handler] = Histogram(LATENCY_BUCKETS)
+            self.queries[handler] = Histogram(QUERY_BUCKETS)
+            self.db_time[handler] = 0.0
+            self.errors[handler] = 0
+        self.latency[handler].observe(elapsed)
+        self.queries[handler].observe(stats.queries)
+        self.db_time[handler] += stats.db_time
+        if failed:
+            self.errors[handler] += 1
+
+    def instrument(self, *engines):
+        """Вешает на движки счетчик запросов и времени в БД для текущего апдейта."""
+        for engine in dict.fromkeys(engines):  # в PostgreSQL читатель и писатель - один движок
+            event.listen(engine.sync_engine, 'before_cursor_execute', _before_execute)
+            event.listen(engine.sync_engine, 'after_cursor_execute', self._after_execute)
+            event.listen(engine.sync_engine, 'handle_error', self._on_error)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._finish(conn)
+
+    def _on_error(self, context):
+        # Для упавшего запроса after_cursor_execute не вызывается - снимаем его отметку здесь
+        conn = context.connection
+        if conn is not None and conn.info.get('query_started'):
+            self._finish(conn)
+
+    def _finish(self, conn):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = current_update.get()
+        if stats is None:
+            self.background_queries += 1
+            return
+        stats.queries += 1
+        stats.db_time += elapsed
+
+    def render(self) -> str:
+        """Снимок в текстовом формате Prometheus."""
+        lines = ['# TYPE bot_handler_seconds histogram']
+        for handler, histogram in self.latency.items():
+            lines += histogram.render('bot_handler_seconds', f'handler="{handler}"')
+        lines.append('# TYPE bot_handler_queries histogram')
+        for handler, histogram in self.queries.items():
+            lines += histogram.render('bot_handler_queries', f'handler="{handler}"')
+        lines.append('# TYPE bot_handler_db_seconds_total counter')
+        lines += [f'bot_handler_db_seconds_total{{handler="{handler}"}} {seconds:.6f}'
+                  for handler, seconds in self.db_time.items()]
+        lines.append('# TYPE bot_handler_errors_total counter')
+        lines += [f'bot_handler_errors_total{{handler="{handler}"}} {count}' for handler, count in self.errors.items()]
+        lines.append('# TYPE bot_background_queries_total counter')
+        lines.append(f'bot_background_queries_total {self.background_queries}')
+        caches = {name: stats() for name, stats in self.caches.items()}
+        for metric, field, kind in (('bot_cache_hits_total', 'hits', 'counter'),
+                                    ('bot_cache_misses_total', 'misses', 'counter'),
+                                    ('bot_cache_entries', 'size', 'gauge')):
+            lines.append(f'# TYPE {metric} {kind}')
+            lines += [f'{metric}{{cache="{name}"}} {stats[field]}' for name, stats in caches.items()]
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Хендлеры по суммарному времени: где бот проводит больше всего; затем попадания в кэши."""
+        rows = sorted(self.latency.items(), key=lambda item: item[1].sum, reverse=True)
+        lines = [
+            f'{handler}: {h.count} апд., среднее {h.sum / h.count * 1000:.1f} ms, p95 <= {h.quantile(0.95) * 1000:.0f} ms, '
+            f'{self.queries[handler].sum / h.count:.1f} запр./апд., в БД {self.db_time[handler] * 1000:.0f} ms, '
+            f'ошибок {self.errors[handler]}'
+            for handler, h in rows
+        ]
+        for name, stats in self.caches.items():
+            stats = stats()
+            lines.append(f'кэш {name}: попаданий {stats["hit_rate"]:.1%} ({stats["hits"]}/{stats["hits"] + stats["misses"]}), '
+                         f'записей {stats["size"]}')
+        return '\n'.join(lines)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def serve(self, host: str, port: int):
+        """Фоновая задача: HTTP-эндпоинт /metrics для Prometheus."""
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host=host, port=port).start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def log_summary(self, interval: float, name: str = ''):
+        """Фоновая задача: раз в interval секунд пишет сводку по хендлерам в лог (name - чья сводка)."""
+        title = f'Метрики хендлеров ({name})' if name else 'Метрики хендлеров'
+        while True:
+            await asyncio.sleep(interval)
+            if self.latency:
+                logger.info('%s:\n%s', title, self.summary())
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Outer-middleware апдейта: время обработки целиком и запросы к БД за это время."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            current_update.reset(token)
+            self.metrics.observe(stats, time.perf_counter() - started, failed)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner-middleware: подписывает текущий апдейт именем хендлера, который его обработал."""
+
+    async def __call__(self, handler, event, data):
+        stats = current_update.get()
+        if stats is not None:
+            stats.handler = data['handler'].callback.__name__
+        return await handler(event, data)
+
+
+metrics = Metrics()
@@ -0,0 +1,98 @@
+"""Защита от быстрых повторных нажатий инлайн-кнопок.
+
+CallbackDebounceMiddleware (outer, на dp.update, перед FSM) отвечает на повтор того же
+callback_data на том же сообщении в течение окна пустым answer() и дальше его не пускает.
+UserLockIsolation (events_isolation диспетчера) обрабатывает апдейты одного пользователя
+по очереди: FSM-мидлварь берет замок до чтения состояния, поэтому второе нажатие
+фильтруется по состоянию, которое выставило первое.
+EditDedupMiddleware (мидлварь сессии бота) не отправляет editMessageText/ReplyMarkup,
+если сообщение уже показывает тот же текст с той же клавиатурой.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText
+
+from middlewares.metrics import current_update
+from utils import TTLCache
+
+
+class CallbackDebounceMiddleware(BaseMiddleware):
+    def __init__(self, window: float, maxsize: int = 10000):
+        self.recent = TTLCache(maxsize=maxsize, ttl=window)  # (user, message, data) -> True
+        self.dropped = 0
+
+    async def __call__(self, handler, event, data):
+        callback = event.callback_query
+        if callback is None:
+            return await handler(event, data)
+        message_id = callback.message.message_id if callback.message else callback.inline_message_id
+        key = (callback.from_user.id, message_id, callback.data)
+        if self.recent.get(key) is not None:
+            # Окно считается от первого нажатия: повтор только гасит "часики" на кнопке
+            self.dropped += 1
+            stats = current_update.get()
+            if stats is not None:
+                stats.handler = 'debounced'
+            await callback.answer()
+            return None
+        self.recent.set(key, True)
+        return await handler(event, data)
+
+
+class UserLockIsolation(BaseEventIsolation):
+    """Как SimpleEventIsolation aiogram, но замок удаляется, как только очередь пользователя пуста."""
+
+    def __init__(self):
+        self._locks = {}  # ключ FSM -> [Lock, апдейтов в обработке или в очереди]
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def close(self):
+        self._locks.clear()
+
+
+def _fingerprint(method) -> int:
+    markup = method.reply_markup.model_dump_json(exclude_none=True) if method.reply_markup else None
+    return hash((getattr(method, 'text', None), str(getattr(method, 'parse_mode', None)), markup))
+
+
+class EditDedupMiddleware(BaseRequestMiddleware):
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600):
+        self.shown = TTLCache(maxsize=maxsize, ttl=ttl)  # (chat, message) -> отпечаток текста и клавиатуры
+        self.skipped = 0
+
+    async def __call__(self, make_request, bot, method):
+        if not isinstance(method, (EditMessageText, EditMessageReplyMarkup)):
+            return await make_request(bot, method)
+        key = (method.chat_id, method.message_id, method.inline_message_id)
+        fingerprint = _fingerprint(method)
+        if self.shown.get(key) == fingerprint:
+            self.skipped += 1
+            return True
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as error:
+            # Сообщение уже такое (например, отредактировано до перезапуска бота) - это не ошибка
+            if 'message is not modified' not in error.message:
+                raise
+            self.skipped += 1
+            result = True
+        self.shown.set(key, fingerprint)
+        return result
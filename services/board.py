@@ -0,0 +1,113 @@
+"""Живая карточка турнира: открытые у игроков экраны турнира обновляются сами.
+
+find_menu подписывает сообщение, в котором показал карточку, а любое нажатие кнопки
+в этом сообщении его отписывает (экран сменился). Раз в BOARD_INTERVAL доска сверяет
+версии турниров в AsyncCore - их повышает и локальная правка, и сброс из соседнего
+процесса - и на каждый изменившийся турнир один раз читает карточку и ставит правку
+сообщений всех зрителей в очередь sender. Кнопка "Обновить" больше не нужна.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from aiogram import BaseMiddleware
+from aiogram.methods import EditMessageText
+
+from database.core import AsyncCore
+from handlers.card import tournament_screen
+from services.sender import sender, Priority
+
+
+logger = logging.getLogger(__name__)
+
+# Как часто доска проверяет, не изменились ли турниры зрителей
+BOARD_INTERVAL = timedelta(seconds=1)
+# Сообщения, открытые дольше этого, больше не обновляем (игрок давно ушел)
+VIEWER_TTL = timedelta(hours=6)
+
+
+class LiveBoard:
+    def __init__(self):
+        self._viewers = defaultdict(dict)  # tournament_id -> {(chat_id, message_id): (tg_id, с какого времени)}
+        self._screens = {}  # (chat_id, message_id) -> tournament_id
+        self._versions = {}  # tournament_id -> версия, которую сейчас видят зрители
+
+    def watch(self, tournament_id: int, chat_id: int, message_id: int, tg_id: int):
+        tournament_id = int(tournament_id)
+        screen = (chat_id, message_id)
+        self.unwatch(chat_id, message_id)
+        self._screens[screen] = tournament_id
+        self._viewers[tournament_id][screen] = (tg_id, time.monotonic())
+        self._versions.setdefault(tournament_id, AsyncCore.tournament_version(tournament_id))
+
+    def unwatch(self, chat_id: int, message_id: int):
+        screen = (chat_id, message_id)
+        tournament_id = self._screens.pop(screen, None)
+        if tournament_id is None:
+            return
+        viewers = self._viewers[tournament_id]
+        viewers.pop(screen, None)
+        if not viewers:
+            del self._viewers[tournament_id]
+            self._versions.pop(tournament_id, None)
+
+    def viewers(self, tournament_id: int) -> int:
+        return len(self._viewers.get(int(tournament_id), ()))
+
+    async def push(self, tournament_id: int):
+        """Ставит в очередь правку всех сообщений, где открыт этот турнир."""
+        expire_before = time.monotonic() - VIEWER_TTL.total_seconds()
+        for screen, (tg_id, since) in list(self._viewers.get(tournament_id, {}).items()):
+            if since < expire_before:
+                self.unwatch(*screen)
+                continue
+            # Карточка читается из БД один раз на версию, текст рисуется раз на зарегистрирован/нет
+            result = await tournament_screen(tournament_id, tg_id)
+            if result is None:
+                self.unwatch(*screen)
+                continue
+            _, _, text, markup = result
+            chat_id, message_id = screen
+            future = sender.submit(
+                EditMessageText(chat_id=chat_id, message_id=message_id, text=text, reply_markup=markup),
+                Priority.NORMAL,
+                # Пока правка ждала в очереди, игрок мог уйти с экрана - тогда не затираем новый экран
+                check=lambda screen=screen: self._screens.get(screen) == tournament_id,
+            )
+            future.add_done_callback(lambda done, screen=screen: self._edited(done, screen))
+
+    def _edited(self, future: asyncio.Future, screen: tuple):
+        if not future.cancelled() and future.exception() is not None:
+            # Сообщение удалено или его уже нельзя редактировать
+            self.unwatch(*screen)
+
+    async def run(self):
+        """Фоновая задача: рассылает зрителям изменившиеся карточки."""
+        while True:
+            await asyncio.sleep(BOARD_INTERVAL.total_seconds())
+            for tournament_id in list(self._viewers):
+                version = AsyncCore.tournament_version(tournament_id)
+                if self._versions.get(tournament_id) == version:
+                    continue
+                self._versions[tournament_id] = version
+                try:
+                    await self.push(tournament_id)
+                except Exception:
+                    logger.exception('Не удалось обновить карточку турнира %s у зрителей', tournament_id)
+
+
+class UnwatchMiddleware(BaseMiddleware):
+    """Outer-middleware callback_query: нажатая кнопка уводит сообщение с экрана турнира."""
+
+    def __init__(self, board: LiveBoard):
+        self.board = board
+
+    async def __call__(self, handler, event, data):
+        if event.message is not None:
+            self.board.unwatch(event.message.chat.id, event.message.message_id)
+        return await handler(event, data)
+
+
+board = LiveBoard()
@@ -0,0 +1,108 @@
+"""Хранилище FSM (состояния FindGame/MyGames/Stats и данные вроде tournament_id).
+
+Бэкенд выбирается в config.fsm_storage:
+    memory - MemoryStorage aiogram, состояния живут до перезапуска (тесты, локальный запуск);
+    sqlite - SQLiteStorage ниже, файл переживает перезапуск и общий для процессов на одной машине;
+    redis  - RedisStorage aiogram (нужен пакет redis), общий для процессов на разных машинах.
+Во всех постоянных бэкендах запись компактная: короткий ключ bot:chat:user и JSON без пробелов.
+"""
+import asyncio
+import json
+from functools import partial
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import fsm_storage, fsm_sqlite_path, redis_url
+
+
+compact_dumps = partial(json.dumps, separators=(',', ':'), ensure_ascii=False)
+
+
+def compact_key(key: StorageKey) -> str:
+    """bot:chat:user, плюс тред/бизнес-подключение/destiny, только если они заданы."""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id is not None or key.business_connection_id is not None or key.destiny != 'default':
+        parts += [str(key.thread_id or ''), key.business_connection_id or '', key.destiny]
+    return ':'.join(parts)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM в отдельном файле SQLite: одна строка (key, state, data) на пользователя в чате."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._opening = asyncio.Lock()
+        # Одно соединение на процесс: незакрытый SELECT одной корутины держит снимок чтения, и запись
+        # другой в нем же при конкурентной записи из соседнего процесса сразу падает с "database is locked"
+        self._lock = asyncio.Lock()
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._db is not None:
+            return self._db
+        async with self._opening:  # первые апдейты приходят пачкой - открываем и создаем таблицу один раз
+            if self._db is None:
+                db = await aiosqlite.connect(self.path)
+                await db.execute('PRAGMA journal_mode = WAL')
+                await db.execute('PRAGMA synchronous = NORMAL')
+                await db.execute('PRAGMA busy_timeout = 5000')
+                await db.execute(
+                    'CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT) WITHOUT ROWID')
+                await db.commit()
+                self._db = db
+        return self._db
+
+    async def _write(self, key: StorageKey, column: str, value: str | None):
+        db = await self._connection()
+        record = compact_key(key)
+        async with self._lock:
+            await db.execute(
+                f'INSERT INTO fsm (key, {column}) VALUES (?, ?) '
+                f'ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}',
+                (record, value),
+            )
+            if value is None:
+                # Пустые строки не храним: состояние сброшено и данных нет
+                await db.execute('DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL', (record,))
+            await db.commit()
+
+    async def _read(self, key: StorageKey, column: str) -> str | None:
+        db = await self._connection()
+        async with self._lock, db.execute(f'SELECT {column} FROM fsm WHERE key = ?', (compact_key(key),)) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def set_state(self, key: StorageKey, state=None):
+        await self._write(key, 'state', state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return await self._read(key, 'state')
+
+    async def set_data(self, key: StorageKey, data) -> None:
+        await self._write(key, 'data', compact_dumps(data) if data else None)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        data = await self._read(key, 'data')
+        return json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+def make_storage(backend: str = fsm_storage) -> BaseStorage:
+    if backend == 'redis':
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as error:
+            # Молча уйти в локальный файл нельзя: процессы на разных машинах перестали бы видеть общие состояния
+            raise RuntimeError('FSM_STORAGE=redis, но пакет redis не установлен (pip install redis)') from error
+        return RedisStorage.from_url(redis_url, key_builder=DefaultKeyBuilder(prefix='fsm'),
+                                     json_dumps=compact_dumps)
+    if backend == 'sqlite':
+        return SQLiteStorage(fsm_sqlite_path)
+    return MemoryStorage()
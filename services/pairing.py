@@ -0,0 +1,221 @@
+"""Швейцарская система: таблица очков в памяти и генерация пар на тур.
+
+Таблица (Standings) поднимается из БД один раз на турнир и дальше обновляется
+инкрементально при каждом результате, так что следующий тур считается без запросов.
+"""
+from database.core import AsyncCore
+
+
+# Значения MatchORM.result
+NOT_PLAYED = ''
+PLAYER1_WIN = 'player1_win'
+PLAYER2_WIN = 'player2_win'
+DRAW = 'draw'
+BYE = 'bye'
+RESULTS = frozenset({NOT_PLAYED, PLAYER1_WIN, PLAYER2_WIN, DRAW, BYE})
+
+WIN_POINTS = 3
+DRAW_POINTS = 1
+
+# Ограничение перебора при поиске пар без повторных встреч; дальше разрешаем реванши
+MAX_PAIRING_STEPS = 200_000
+
+
+class PlayerStanding:
+    __slots__ = ('user_id', 'points', 'wins', 'losses', 'draws', 'byes', 'opponents', 'dropped')
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.points = 0
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+        self.byes = 0
+        self.opponents = set()
+        self.dropped = False
+
+
+class Standings:
+    """Очки, соперники и баи игроков одного турнира."""
+
+    def __init__(self, tournament_id: int, players):
+        self.tournament_id = tournament_id
+        self.players = {user_id: PlayerStanding(user_id) for user_id in players}
+        self.rounds = 0
+
+    @classmethod
+    def from_matches(cls, tournament_id: int, players, matches) -> 'Standings':
+        standings = cls(tournament_id, players)
+        for match in matches:
+            standings.add_match(match)
+        return standings
+
+    def _player(self, user_id: int) -> PlayerStanding:
+        if user_id not in self.players:
+            self.players[user_id] = PlayerStanding(user_id)
+        return self.players[user_id]
+
+    def add_match(self, match):
+        """Учитывает созданный матч (соперников) и его результат, если он уже есть."""
+        self.rounds = max(self.rounds, match.round)
+        player1 = self._player(match.player1_id)
+        if match.player2_id is not None:
+            player2 = self._player(match.player2_id)
+            player1.opponents.add(player2.user_id)
+            player2.opponents.add(player1.user_id)
+        self._score(match, match.result, +1)
+
+    def record_result(self, match, previous: str = NOT_PLAYED):
+        """Инкрементально применяет результат матча (с откатом прежнего, если его исправили)."""
+        self._score(match, previous, -1)
+        self._score(match, match.result, +1)
+
+    def _score(self, match, result: str, sign: int):
+        player1 = self._player(match.player1_id)
+        if match.player2_id is None:
+            # Матч без соперника засчитывается только как бай
+            if result == BYE:
+                player1.byes += sign
+                player1.wins += sign
+                player1.points += sign * WIN_POINTS
+            return
+        player2 = self._player(match.player2_id)
+        if result == DRAW:
+            for player in (player1, player2):
+                player.draws += sign
+                player.points += sign * DRAW_POINTS
+        elif result in (PLAYER1_WIN, PLAYER2_WIN):
+            winner, loser = (player1, player2) if result == PLAYER1_WIN else (player2, player1)
+            winner.wins += sign
+            winner.points += sign * WIN_POINTS
+            loser.losses += sign
+
+    def drop(self, user_id: int):
+        """Игрок сдался и больше не получает пар."""
+        self._player(user_id).dropped = True
+
+    def buchholz(self, player: PlayerStanding) -> int:
+        return sum(self.players[opponent].points for opponent in player.opponents if opponent in self.players)
+
+    def ranking(self) -> list[PlayerStanding]:
+        """Игроки по очкам, затем по Бухгольцу (сумма очков соперников), затем по id."""
+        return sorted(self.players.values(),
+                      key=lambda p: (-p.points, -self.buchholz(p), p.user_id))
+
+    def pair_round(self) -> list[tuple]:
+        """Пары следующего тура: [(player1_id, player2_id | None)], None - бай.
+
+        Игроки идут по убыванию очков, каждый ищет ближайшего по очкам соперника,
+        с которым еще не играл; при тупике перебор откатывается назад.
+        """
+        active = [p for p in self.ranking() if not p.dropped]
+        pairs = []
+        if len(active) % 2:
+            # Бай - самому низкому в таблице из тех, кто его еще не получал
+            bye = next((p for p in reversed(active) if not p.byes), active[-1])
+            active.remove(bye)
+            pairs.append((bye.user_id, None))
+
+        matched = _match(active, allow_rematch=False)
+        if matched is None:
+            matched = _match(active, allow_rematch=True)
+        return matched + pairs
+
+
+def check_result(match, result: str):
+    """ValueError, если результата нет в RESULTS или он не подходит матчу: бай - только у матча без соперника."""
+    if result not in RESULTS:
+        raise ValueError(f'Неизвестный результат матча {match.id}: {result!r}')
+    if (result == BYE) != (match.player2_id is None):
+        raise ValueError(f'Результат {result!r} не подходит матчу {match.id}'
+                         f'{" без соперника" if match.player2_id is None else ""}')
+
+
+def _match(players: list, allow_rematch: bool):
+    pairs = []
+    used = [False] * len(players)
+    steps = 0
+
+    def solve(start: int) -> bool:
+        nonlocal steps
+        while start < len(players) and used[start]:
+            start += 1
+        if start == len(players):
+            return True
+        used[start] = True
+        player = players[start]
+        for index in range(start + 1, len(players)):
+            if used[index]:
+                continue
+            opponent = players[index]
+            if not allow_rematch and opponent.user_id in player.opponents:
+                continue
+            steps += 1
+            if steps > MAX_PAIRING_STEPS:
+                return False
+            used[index] = True
+            pairs.append((player.user_id, opponent.user_id))
+            if solve(start + 1):
+                return True
+            pairs.pop()
+            used[index] = False
+        used[start] = False
+        return False
+
+    return pairs if solve(0) else None
+
+
+# Таблицы идущих турниров: tournament_id -> Standings
+standings = {}
+
+
+async def get_standings(tournament_id: int) -> Standings:
+    tournament_id = int(tournament_id)
+    if tournament_id not in standings:
+        players = await AsyncCore.get_tournament_players(tournament_id)
+        matches = await AsyncCore.get_tournament_matches(tournament_id)
+        standings[tournament_id] = Standings.from_matches(tournament_id, players, matches)
+    return standings[tournament_id]
+
+
+async def start_round(tournament_id: int) -> list:
+    """Генерирует пары следующего тура и записывает их одним INSERT. Возвращает матчи тура."""
+    table = await get_standings(tournament_id)
+    round_no = table.rounds + 1
+    pairs = [(player1, player2, BYE if player2 is None else NOT_PLAYED)
+             for player1, player2 in table.pair_round()]
+    matches = await AsyncCore.add_round(table.tournament_id, round_no, pairs)
+    for match in matches:
+        table.add_match(match)
+    return matches
+
+
+async def report_result(match_id: int, result: str):
+    """Сохраняет результат матча и обновляет таблицу без перечитывания турнира.
+
+    Неизвестный или неподходящий матчу результат - ValueError, в БД ничего не пишется.
+    """
+    if result not in RESULTS:
+        raise ValueError(f'Неизвестный результат матча {match_id}: {result!r}')
+    updated = await AsyncCore.update_match_result(match_id, result, check=check_result)
+    if updated is None:
+        return None
+    match, previous = updated
+    if match.tournament_id in standings:
+        standings[match.tournament_id].record_result(match, previous)
+    return match
+
+
+async def report_results(results: list) -> list:
+    """Пачка результатов [(match_id, result)] одной транзакцией - например, при закрытии тура.
+
+    Один неподходящий результат (ValueError) откатывает всю пачку.
+    """
+    for match_id, result in results:
+        if result not in RESULTS:
+            raise ValueError(f'Неизвестный результат матча {match_id}: {result!r}')
+    updated = await AsyncCore.apply_results(results, check=check_result)
+    for match, previous in updated:
+        if match.tournament_id in standings:
+            standings[match.tournament_id].record_result(match, previous)
+    return [match for match, _ in updated]
@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+from database.core import AsyncCore
+from database.models import TournamentStatus
+from utils import nearest_weekend
+
+
+logger = logging.getLogger(__name__)
+
+
+class WeekSchedule:
+    """Снимок турниров ближайших выходных, который живет в памяти.
+
+    Пересчитывается при старте и в полночь; в БД идет только когда набор дат
+    действительно сменился, поэтому find_game отдает список без запросов.
+    """
+
+    def __init__(self):
+        self.dates = ()
+        self.tournaments = ()
+
+    async def refresh(self):
+        dates = tuple(await nearest_weekend())
+        if dates == self.dates:
+            return
+        self.tournaments = tuple(await AsyncCore.upsert_tournaments(list(dates)))
+        self.dates = dates
+        for tournament in self.tournaments:
+            lifecycle.schedule(tournament.id, tournament.date, TournamentStatus.PLANNED)
+        logger.info('Турниры недели: %s', ', '.join(t.name for t in self.tournaments))
+
+    async def current(self) -> tuple:
+        if not self.tournaments:
+            await self.refresh()
+        return self.tournaments
+
+    async def run(self):
+        """Фоновая задача: пересчитывает снимок после каждой полуночи."""
+        while True:
+            now = datetime.now()
+            midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+            await asyncio.sleep((midnight - now).total_seconds() + 1)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('Не удалось обновить турниры недели')
+
+
+# Минимум игроков для старта турнира; с меньшим числом турнир отменяется
+MIN_PLAYERS = 8
+# Сколько после старта длится драфт, прежде чем начнутся игры
+DRAFT_DURATION = timedelta(hours=1)
+# Переходы, просроченные сильнее этого (бот был выключен), применяются без уведомлений
+STALE_AFTER = timedelta(hours=1)
+# Пауза перед повтором, если UPDATE статусов не прошел (например, "database is locked")
+APPLY_RETRY = timedelta(seconds=30)
+
+
+class LifecycleScheduler:
+    """Переводит турниры по статусам в назначенное время.
+
+    Ожидающие переходы лежат в куче по времени; задача спит до ближайшего,
+    применяет все наступившие одним UPDATE на статус и уведомляет игроков.
+    """
+
+    def __init__(self):
+        self._heap = []  # (due, tournament_id, from_status)
+        self._queued = set()  # (tournament_id, from_status), чтобы не дублировать переходы
+        self._wakeup = asyncio.Event()
+        self.notify = None  # async notify(tg_id, text), подключается в main.py
+
+    def schedule(self, tournament_id: int, date: datetime, status: TournamentStatus):
+        if status == TournamentStatus.PLANNED:
+            due = date
+        elif status == TournamentStatus.UPCOMING:
+            due = date + DRAFT_DURATION
+        else:
+            return
+        key = (tournament_id, status)
+        if key in self._queued:
+            return
+        self._queued.add(key)
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()  # новый переход раньше текущего ожидания
+        heapq.heappush(self._heap, (due, tournament_id, status))
+
+    async def load(self):
+        """Поднимает ожидающие переходы из БД (при старте бота)."""
+        for tournament_id, date, status in await AsyncCore.get_pending_tournaments():
+            self.schedule(tournament_id, date, status)
+
+    def _pop_due(self, now: datetime) -> dict:
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            when, tournament_id, status = heapq.heappop(self._heap)
+            self._queued.discard((tournament_id, status))
+            due.setdefault(status, []).append((tournament_id, when))
+        return due
+
+    def _requeue(self, status: TournamentStatus, items: list):
+        """Возвращает в кучу переходы, которые не удалось применить, с прежним сроком."""
+        for tournament_id, when in items:
+            key = (tournament_id, status)
+            if key not in self._queued:
+                self._queued.add(key)
+                heapq.heappush(self._heap, (when, tournament_id, status))
+
+    async def _apply(self, now: datetime):
+        due = self._pop_due(now)
+        fresh = {tournament_id for items in due.values()
+                 for tournament_id, when in items if now - when <= STALE_AFTER}
+        messages = {}
+        error = None
+        # Один UPDATE на статус; если он не прошел, его переходы вернутся в кучу, а уже примененные уведомят
+        for status, transition in ((TournamentStatus.PLANNED, self._start),
+                                   (TournamentStatus.UPCOMING, self._begin_games)):
+            items = due.get(status)
+            if not items:
+                continue
+            try:
+                messages.update(await transition(items))
+            except Exception as failure:
+                self._requeue(status, items)
+                error = error or failure
+
+        messages = {tournament_id: text for tournament_id, text in messages.items() if tournament_id in fresh}
+        if messages and self.notify:
+            registrants = await AsyncCore.get_registrants(list(messages))
+            for tournament_id, text in messages.items():
+                for tg_id in registrants[tournament_id]:
+                    await self.notify(tg_id, text)
+        if error is not None:
+            raise error
+
+    async def _start(self, items: list) -> dict:
+        messages = {}
+        started, cancelled = await AsyncCore.start_tournaments([tournament_id for tournament_id, _ in items],
+                                                               MIN_PLAYERS)
+        for tournament_id in cancelled:
+            messages[tournament_id] = f'Турнир #{tournament_id} отменен: набралось меньше {MIN_PLAYERS} игроков.'
+        for tournament_id in started:
+            messages[tournament_id] = f'Турнир #{tournament_id} начался, идет драфт!'
+        when = dict(items)
+        for tournament_id in started:
+            self.schedule(tournament_id, when[tournament_id], TournamentStatus.UPCOMING)
+        return messages
+
+    async def _begin_games(self, items: list) -> dict:
+        advanced = await AsyncCore.advance_tournaments([tournament_id for tournament_id, _ in items],
+                                                       TournamentStatus.UPCOMING, TournamentStatus.ONGOING)
+        return {tournament_id: f'Драфт турнира #{tournament_id} окончен, начинаются игры!'
+                for tournament_id in advanced}
+
+    async def run(self):
+        """Фоновая задача: спит до ближайшего перехода и применяет наступившие."""
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max((self._heap[0][0] - datetime.now()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                continue  # появился более ранний переход - пересчитываем ожидание
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._apply(datetime.now())
+            except Exception:
+                logger.exception('Не удалось применить переходы статусов турниров, повтор через %s', APPLY_RETRY)
+                await asyncio.sleep(APPLY_RETRY.total_seconds())
+
+
+# Как часто рейтинг в памяти сверяется с users (страховка от правок мимо AsyncCore)
+LEADERBOARD_RECONCILE = timedelta(minutes=30)
+
+
+async def reconcile_leaderboard():
+    """Фоновая задача: периодически перечитывает рейтинг из БД."""
+    while True:
+        await asyncio.sleep(LEADERBOARD_RECONCILE.total_seconds())
+        try:
+            await AsyncCore.load_leaderboard()
+        except Exception:
+            logger.exception('Не удалось сверить рейтинг с БД')
+
+
+lifecycle = LifecycleScheduler()
+week_schedule = WeekSchedule()
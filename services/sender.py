@@ -0,0 +1,221 @@
+"""Очередь исходящих сообщений с ограничениями Telegram.
+
+Рассылки (уведомления о турнирах, анонсы) не отправляются в цикле по одному, а ставятся
+в очередь: общий token bucket держит скорость не выше send_rate сообщений в секунду,
+в один чат уходит не чаще раза в send_chat_interval, несколько запросов летят параллельно.
+Полосы приоритета: срочное (паринги, старт/отмена) обгоняет служебное и анонсы.
+На 429 очередь целиком ждет retry_after и повторяет запрос.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+from config import send_rate, send_chat_interval, send_concurrency, send_retries
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Меньше - раньше; внутри полосы - в порядке постановки."""
+    URGENT = 0  # паринги раундов, старт и отмена турниров
+    NORMAL = 1  # служебные сообщения
+    BULK = 2  # анонсы и прочие рассылки
+
+
+class TokenBucket:
+    """rate токенов в секунду, копится не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take(self):
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class Job:
+    __slots__ = ('method', 'priority', 'seq', 'future', 'check', 'attempts')
+
+    def __init__(self, method: TelegramMethod, priority: Priority, seq: int, future: asyncio.Future, check=None):
+        self.method = method
+        self.check = check
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.attempts = 0
+
+    @property
+    def chat_id(self):
+        return getattr(self.method, 'chat_id', None)
+
+
+def _consume(future: asyncio.Future):
+    # Ошибку уже записали в лог; чтобы asyncio не ругался на невостребованную, забираем ее здесь
+    if not future.cancelled():
+        future.exception()
+
+
+class Sender:
+    def __init__(self, rate: float, chat_interval: float, concurrency: int, retries: int):
+        self.bot = None  # подключается в main.py
+        # Запаса не копим: с полным ведром в первую секунду ушло бы вдвое больше лимита
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.chat_interval = chat_interval
+        self.retries = retries
+        self._slots = asyncio.Semaphore(concurrency)
+        self._ready = []  # (priority, seq, Job) - можно отправлять
+        self._waiting = []  # (not_before, priority, seq, Job) - ждут свободы чата или retry_after
+        self._chat_free_at = {}  # chat_id -> monotonic, раньше которого в чат не пишем
+        self._paused_until = 0.0  # глобальная пауза после 429
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight = set()  # задачи отправки; ссылки держим, чтобы их не собрал GC
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._ready) + len(self._waiting) + len(self._in_flight)
+
+    def submit(self, method: TelegramMethod, priority: Priority = Priority.NORMAL, check=None) -> asyncio.Future:
+        """Ставит вызов Bot API в очередь; future завершится его результатом или ошибкой.
+
+        check() вызывается перед самой отправкой: если он вернул False, вызов устарел,
+        снимается с очереди и future отменяется.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume)
+        job = Job(method, priority, next(self._seq), future, check)
+        heapq.heappush(self._ready, (priority, job.seq, job))
+        self._wakeup.set()
+        return future
+
+    def send_message(self, chat_id: int, text: str, priority: Priority = Priority.NORMAL, **kwargs) -> asyncio.Future:
+        return self.submit(SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    def _release_waiting(self, now: float):
+        while self._waiting and self._waiting[0][0] <= now:
+            _, priority, seq, job = heapq.heappop(self._waiting)
+            heapq.heappush(self._ready, (priority, seq, job))
+
+    def _pop_ready(self, now: float) -> Job | None:
+        """Первое по приоритету задание, чей чат уже свободен; остальные откладывает."""
+        while self._ready:
+            priority, seq, job = heapq.heappop(self._ready)
+            free_at = self._chat_free_at.get(job.chat_id, 0.0)
+            if free_at <= now:
+                return job
+            heapq.heappush(self._waiting, (free_at, priority, seq, job))
+        return None
+
+    def _next_wakeup(self, now: float) -> float | None:
+        if self._paused_until > now:
+            return self._paused_until - now
+        if self._ready:
+            return 0.0
+        if self._waiting:
+            return max(self._waiting[0][0] - now, 0.0)
+        return None
+
+    async def run(self):
+        """Фоновая задача: отправляет задания с учетом лимитов."""
+        while True:
+            now = time.monotonic()
+            self._release_waiting(now)
+            timeout = self._next_wakeup(now)
+            if timeout != 0.0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._slots.acquire()
+            await self.bucket.take()
+            now = time.monotonic()
+            self._release_waiting(now)
+            job = self._pop_ready(now)
+            if job is None or self._paused_until > now:
+                # Пока ждали токен, все оставшиеся чаты оказались заняты или пришел 429
+                if job is not None:
+                    heapq.heappush(self._ready, (job.priority, job.seq, job))
+                self.bucket.give_back()
+                self._slots.release()
+                continue
+            if job.check is not None and not job.check():
+                job.future.cancel()
+                self.bucket.give_back()
+                self._slots.release()
+                continue
+            if job.chat_id is not None:
+                self._chat_free_at[job.chat_id] = now + self.chat_interval
+                if len(self._chat_free_at) > 10000:
+                    self._chat_free_at = {chat: at for chat, at in self._chat_free_at.items() if at > now}
+            task = asyncio.create_task(self._send(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, job: Job):
+        try:
+            result = await self.bot(job.method)
+        except TelegramRetryAfter as error:
+            # Флуд-лимит общий для бота: приостанавливаем всю очередь, а не только этот чат
+            resume = time.monotonic() + error.retry_after
+            self._paused_until = max(self._paused_until, resume)
+            logger.warning('Telegram просит подождать %s с, в очереди %s', error.retry_after, len(self))
+            self._retry(job, resume, error)
+        except TelegramNetworkError as error:
+            self._retry(job, time.monotonic() + 2 ** job.attempts, error)
+        except Exception as error:
+            # Бот заблокирован, чат не найден, неверный запрос и т.п. - повтор не поможет
+            self.failed += 1
+            logger.warning('Не удалось отправить %s в чат %s: %s', type(job.method).__name__, job.chat_id, error)
+            job.future.set_exception(error)
+        else:
+            self.sent += 1
+            job.future.set_result(result)
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def _retry(self, job: Job, not_before: float, error: Exception):
+        job.attempts += 1
+        if job.attempts > self.retries:
+            self.failed += 1
+            logger.warning('Сдались после %s попыток отправить в чат %s: %s', job.attempts, job.chat_id, error)
+            job.future.set_exception(error)
+            return
+        self.retried += 1
+        heapq.heappush(self._waiting, (not_before, job.priority, job.seq, job))
+
+    async def drain(self, timeout: float):
+        """Ждет, пока очередь опустеет (при остановке бота), но не дольше timeout секунд."""
+        deadline = time.monotonic() + timeout
+        while len(self) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if len(self):
+            logger.warning('Остановка: не отправлено %s сообщений', len(self))
+
+
+sender = Sender(send_rate, send_chat_interval, send_concurrency, send_retries)
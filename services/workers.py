@@ -0,0 +1,195 @@
+"""Многопроцессный режим: фронт принимает апдейты и раздает их воркерам по user_id.
+
+Фронт (процесс main.py) получает апдейты polling'ом или вебхуком, но сам их не обрабатывает:
+апдейт уходит в очередь воркера user_id % N, поэтому все апдейты одного пользователя
+попадают в один процесс, а там выполняются строго по очереди. Разные пользователи
+обрабатываются параллельно - и внутри воркера, и между ядрами.
+
+Кэши у каждого процесса свои. Профили разбиты по воркерам естественно (пользователь живет
+в одном процессе), а общие сбросы - версии карточек турниров, справочник сетов, рейтинг -
+воркеры отправляют фронту, и тот рассылает их остальным (AsyncCore.apply_invalidation).
+Переходы статусов турниров и уведомления делает только фронт.
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from aiogram.dispatcher.dispatcher import DEFAULT_BACKOFF_CONFIG
+from aiogram.utils.backoff import Backoff
+from aiohttp import web
+
+from config import send_rate, metrics_host, metrics_port, metrics_log_interval
+from services.sender import sender
+
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(update: dict) -> int:
+    """id пользователя-отправителя апдейта (или чата), иначе update_id."""
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get('from') or value.get('user') or value.get('chat')
+            if sender:
+                return sender['id']
+    return update['update_id']
+
+
+def share_send_rate(workers: int):
+    """Лимит Telegram общий на бота: фронт и каждый воркер получают равную долю."""
+    sender.bucket.rate = send_rate / (workers + 1)
+
+
+async def _queue_get(queue):
+    return await asyncio.get_running_loop().run_in_executor(None, queue.get)
+
+
+def _feed_in_order(chains: dict, user_id: int, dp, bot, update: dict):
+    """Запускает обработку апдейта после предыдущего апдейта того же пользователя."""
+    previous = chains.get(user_id)
+
+    async def run():
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            pass  # aiogram уже записал ошибку в лог, следующий апдейт пользователя обрабатываем как обычно
+
+    task = asyncio.create_task(run())
+    chains[user_id] = task
+    task.add_done_callback(lambda done: chains.pop(user_id) if chains.get(user_id) is done else None)
+
+
+async def _worker(index: int, count: int, inbox, events):
+    # spawn уже выполнил main.py в этом процессе как __main__ (бот, dp, роутеры) - второй раз не импортируем
+    import __main__ as main
+    from database.core import AsyncCore, write_behind, invalidation_listeners, engine, read_engine
+    from services.scheduler import week_schedule, reconcile_leaderboard
+    from services.board import board
+    from middlewares.metrics import metrics
+
+    await AsyncCore.load_set_catalog()
+    await AsyncCore.load_leaderboard()
+    await week_schedule.refresh()
+    # Карточки зрителей правятся здесь: пользователь и его сообщения живут в своем воркере
+    share_send_rate(count)
+    background = [
+        asyncio.create_task(sender.run()),
+        asyncio.create_task(board.run()),
+        asyncio.create_task(week_schedule.run()),
+        asyncio.create_task(reconcile_leaderboard()),
+        asyncio.create_task(write_behind.run()),
+    ]
+    # Хендлеры работают здесь, поэтому и счетчики свои: у каждого воркера отдельный порт
+    if metrics_port:
+        background.append(asyncio.create_task(metrics.serve(metrics_host, metrics_port + index + 1)))
+    if metrics_log_interval:
+        background.append(asyncio.create_task(metrics.log_summary(metrics_log_interval, f'воркер {index}')))
+    invalidation_listeners.append(lambda kind, key: events.put((index, kind, key)))
+    chains = {}
+    try:
+        while (message := await _queue_get(inbox)) is not None:
+            if message[0] == 'update':
+                _, user_id, update = message
+                _feed_in_order(chains, user_id, main.dp, main.bot, update)
+            else:
+                _, kind, key = message
+                await AsyncCore.apply_invalidation(kind, key)
+        if chains:
+            await asyncio.wait(list(chains.values()))
+        await sender.drain(5)
+    finally:
+        for task in background:
+            task.cancel()
+        await AsyncCore.flush_writes()
+        # Потоки соединений aiosqlite (FSM и пулы движков) не дали бы процессу завершиться
+        await main.dp.storage.close()
+        await engine.dispose()
+        await read_engine.dispose()
+        await main.bot.session.close()
+
+
+def worker_main(index: int, count: int, inbox, events):
+    # Ctrl+C ловит фронт и останавливает воркеров сам, дав им доделать начатые апдейты
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_worker(index, count, inbox, events))
+
+
+class Front:
+    def __init__(self, bot, workers: int):
+        context = multiprocessing.get_context('spawn')
+        self.bot = bot
+        self.events = context.Queue()
+        self.inboxes = [context.Queue() for _ in range(workers)]
+        self.processes = [
+            context.Process(target=worker_main, args=(index, workers, inbox, self.events), name=f'bot-worker-{index}')
+            for index, inbox in enumerate(self.inboxes)
+        ]
+
+    def dispatch(self, update: dict):
+        user_id = shard_key(update)
+        self.inboxes[user_id % len(self.inboxes)].put(('update', user_id, update))
+
+    def broadcast(self, kind: str, key, origin: int | None = None):
+        for index, inbox in enumerate(self.inboxes):
+            if index != origin:
+                inbox.put(('invalidate', kind, key))
+
+    async def relay(self):
+        """Пересылает сбросы кэшей от воркера остальным воркерам."""
+        from database.core import AsyncCore
+
+        while (event := await _queue_get(self.events)) is not None:
+            origin, kind, key = event
+            self.broadcast(kind, key, origin)
+            await AsyncCore.apply_invalidation(kind, key)
+
+    async def poll(self, allowed_updates: list):
+        """getUpdates в цикле; как и start_polling aiogram, ошибки Bot API и сети переживает с backoff."""
+        backoff = Backoff(DEFAULT_BACKOFF_CONFIG)
+        offset = None
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+            except Exception as error:
+                logger.error('Не удалось получить апдейты - %s: %s, повтор через %.1f с',
+                             type(error).__name__, error, backoff.next_delay)
+                await backoff.asleep()
+                continue
+            backoff.reset()
+            for update in updates:
+                offset = update.update_id + 1
+                self.dispatch(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+
+    async def serve_webhook(self, host: str, port: int, path: str, secret: str | None):
+        async def handle(request: web.Request) -> web.Response:
+            if secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret:
+                return web.Response(status=401)
+            self.dispatch(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(path, handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host=host, port=port).start()
+        logger.info('Webhook фронта слушает %s:%s%s, воркеров: %s', host, port, path, len(self.inboxes))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    def start(self):
+        share_send_rate(len(self.processes))
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        for inbox in self.inboxes:
+            inbox.put(None)
+        self.events.put(None)
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,53 @@
+"""Рейтинг в памяти: порядок, общие места при равенстве и инкрементальные обновления."""
+import random
+
+from database.dto import LeaderboardEntry
+from database.leaderboard import Leaderboard
+
+
+def _naive_order(entries):
+    return sorted(entries, key=lambda entry: (-entry.wins, -entry.winrate, entry.user_id))
+
+
+def test_top_and_rank():
+    board = Leaderboard()
+    board.load([
+        LeaderboardEntry(1, 'a', 5, 5),
+        LeaderboardEntry(2, 'b', 5, 0),
+        LeaderboardEntry(3, 'c', 7, 3),
+        LeaderboardEntry(4, 'd', 5, 5),
+    ])
+    assert [entry.user_id for entry in board.top(3)] == [3, 2, 1]
+    assert [board.rank(user_id) for user_id in (3, 2, 1, 4)] == [1, 2, 3, 3]
+    assert board.rank(99) is None
+    assert len(board) == 4
+
+
+def test_update_moves_one_entry():
+    board = Leaderboard()
+    board.load([LeaderboardEntry(1, 'a', 1, 0), LeaderboardEntry(2, 'b', 2, 0)])
+    board.update(LeaderboardEntry(1, 'a', 3, 0))
+    board.update(LeaderboardEntry(5, 'e', 0, 1))
+    assert [entry.user_id for entry in board.top(10)] == [1, 2, 5]
+    assert board.rank(1) == 1
+
+
+def test_matches_full_resort_after_random_updates():
+    rng = random.Random(1)
+    entries = {user_id: LeaderboardEntry(user_id, str(user_id), rng.randrange(5), rng.randrange(5))
+               for user_id in range(50)}
+    board = Leaderboard()
+    board.load(entries.values())
+    for _ in range(300):
+        user_id = rng.randrange(60)
+        entries[user_id] = LeaderboardEntry(user_id, str(user_id), rng.randrange(10), rng.randrange(10))
+        board.update(entries[user_id])
+    assert board.top(len(entries)) == _naive_order(entries.values())
+
+
+def test_load_reports_drift():
+    board = Leaderboard()
+    assert board.load([LeaderboardEntry(1, 'a', 1, 0), LeaderboardEntry(2, 'b', 0, 1)]) == 2
+    assert board.load([LeaderboardEntry(1, 'a', 1, 0), LeaderboardEntry(2, 'b', 1, 1)]) == 1
+    assert board.load([LeaderboardEntry(1, 'a', 1, 0)]) == 1
+    assert board.loaded
@@ -0,0 +1,30 @@
+"""Учет запросов к БД в Metrics: упавший запрос не оставляет отметку времени на соединении."""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from middlewares.metrics import Metrics
+
+
+def test_failed_query_does_not_leak_start_marks(tmp_path):
+    metrics = Metrics()
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "metrics.sqlite3"}')
+    metrics.instrument(engine)
+
+    async def run():
+        try:
+            async with engine.connect() as conn:
+                for _ in range(3):
+                    with pytest.raises(OperationalError):
+                        await conn.execute(text('SELECT * FROM missing_table'))
+                await conn.execute(text('SELECT 1'))
+                raw = await conn.get_raw_connection()
+                return raw.info.get('query_started')
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == []
+    assert metrics.background_queries == 4
@@ -0,0 +1,89 @@
+"""Свойства швейцарки в памяти: без реваншей, не больше одного бая на игрока, пары внутри групп по очкам."""
+import asyncio
+import random
+from itertools import count
+
+import pytest
+
+from database.dto import MatchDTO
+from services import pairing
+from services.pairing import Standings, check_result, BYE, DRAW, NOT_PLAYED, PLAYER1_WIN, PLAYER2_WIN
+
+
+def _play_rounds(players: int, rounds: int, seed: int = 0, results=(PLAYER1_WIN, PLAYER2_WIN, DRAW)):
+    """Играет rounds туров со случайными результатами. Возвращает (таблицу, [пары каждого тура])."""
+    rng = random.Random(seed)
+    table = Standings(1, range(1, players + 1))
+    match_ids = count(1)
+    history = []
+    for round_no in range(1, rounds + 1):
+        pairs = table.pair_round()
+        history.append(pairs)
+        for player1, player2 in pairs:
+            match = MatchDTO(next(match_ids), 1, round_no, player1, player2, BYE if player2 is None else NOT_PLAYED)
+            table.add_match(match)
+            if player2 is not None:
+                played = MatchDTO(match.id, 1, round_no, player1, player2, rng.choice(results))
+                table.record_result(played)
+    return table, history
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_no_rematches(seed):
+    # 8 игроков, 4 тура: пары без повторных встреч всегда существуют
+    _, history = _play_rounds(8, 4, seed)
+    met = [frozenset(pair) for pairs in history for pair in pairs]
+    assert len(met) == len(set(met)) == 16
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_one_bye_per_player(seed):
+    table, history = _play_rounds(7, 7, seed)
+    byes = [player1 for pairs in history for player1, player2 in pairs if player2 is None]
+    assert len(byes) == 7
+    assert sorted(byes) == list(range(1, 8))
+    assert all(player.byes == 1 for player in table.players.values())
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pairs_within_score_groups(seed):
+    # После тура без ничьих 8 игроков делятся на группы 3 и 0 очков поровну - пары не пересекают группы
+    table, _ = _play_rounds(8, 1, seed, results=(PLAYER1_WIN, PLAYER2_WIN))
+    for player1, player2 in table.pair_round():
+        assert table.players[player1].points == table.players[player2].points
+
+
+def test_record_result_replaces_previous():
+    table = Standings(1, [1, 2])
+    match = MatchDTO(1, 1, 1, 1, 2, NOT_PLAYED)
+    table.add_match(match)
+    table.record_result(MatchDTO(1, 1, 1, 1, 2, PLAYER1_WIN))
+    table.record_result(MatchDTO(1, 1, 1, 1, 2, DRAW), previous=PLAYER1_WIN)
+    assert [(p.points, p.wins, p.losses, p.draws) for p in table.ranking()] == [(1, 0, 0, 1), (1, 0, 0, 1)]
+
+
+def test_bye_match_counts_only_bye():
+    # Старые строки с ничьей у матча без соперника не роняют таблицу и не дают очков
+    table = Standings.from_matches(1, [1], [MatchDTO(1, 1, 1, 1, None, DRAW)])
+    assert table.players[1].points == 0
+    table.record_result(MatchDTO(1, 1, 1, 1, None, BYE), previous=DRAW)
+    assert (table.players[1].points, table.players[1].byes) == (pairing.WIN_POINTS, 1)
+
+
+def test_check_result():
+    match = MatchDTO(1, 1, 1, 1, 2, NOT_PLAYED)
+    bye = MatchDTO(2, 1, 1, 3, None, BYE)
+    for result in (NOT_PLAYED, PLAYER1_WIN, PLAYER2_WIN, DRAW):
+        check_result(match, result)
+    check_result(bye, BYE)
+    for target, result in ((match, 'win'), (match, BYE), (bye, DRAW), (bye, PLAYER2_WIN), (bye, NOT_PLAYED)):
+        with pytest.raises(ValueError):
+            check_result(target, result)
+
+
+def test_report_result_rejects_unknown_value():
+    # Неизвестное значение отбрасывается до обращения к БД
+    with pytest.raises(ValueError):
+        asyncio.run(pairing.report_result(1, 'player3_win'))
+    with pytest.raises(ValueError):
+        asyncio.run(pairing.report_results([(1, PLAYER1_WIN), (2, 'win')]))
@@ -0,0 +1,18 @@
+"""Планы горячих запросов: на свежей схеме после миграций ни один не уходит в полный скан таблицы."""
+from sqlalchemy import create_engine
+
+from database.migrations import run_migrations, explain_hot_queries, full_scans
+from database.models import Base
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "plans.sqlite3"}')
+    try:
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            run_migrations(conn)
+            plans = explain_hot_queries(conn)
+    finally:
+        engine.dispose()
+    assert plans
+    assert full_scans(plans) == {}
@@ -0,0 +1,52 @@
+"""TTLCache: вытеснение по LRU, истечение записей и счетчики попаданий."""
+import utils
+from utils import TTLCache
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'a' стал самым свежим
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('a', 1)
+    now[0] += 4
+    assert cache.get('a') == 1
+    now[0] += 2
+    assert cache.peek('a') is None
+    assert cache.get('a', 'gone') == 'gone'
+    assert len(cache) == 0
+
+
+def test_peek_does_not_count_or_reorder():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.peek('a') == 1
+    assert cache.peek('x') is None
+    cache.set('c', 3)  # peek не освежил 'a' - вытесняется он
+    assert cache.peek('a') is None
+    assert cache.stats() == {'size': 2, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+
+
+def test_stats_pop_and_clear():
+    cache = TTLCache()
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    assert cache.stats() == {'size': 1, 'hits': 2, 'misses': 1, 'hit_rate': 0.667}
+    assert cache.pop('a') == 1
+    assert cache.pop('a', 'none') == 'none'
+    cache.set('b', 2)
+    cache.clear()
+    assert len(cache) == 0
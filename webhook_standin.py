@@ -0,0 +1,153 @@
+"""Заглушка Telegram для локальной проверки webhook-режима.
+
+Поднимает фейковый Bot API (отвечает "ok" на любой метод и считает ответы бота)
+и шлет в вебхук бота синтетические апдейты: /start и нажатия "Найти игру"/"Назад".
+
+Запуск:
+    BOT_MODE=webhook TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+    python webhook_standin.py [--updates 500 --users 50 --concurrency 20 --taps 1]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+from aiohttp import ClientSession, ClientError, web
+
+from config import webhook_port, webhook_path, webhook_secret
+
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+# Методы, которыми бот отвечает пользователю на апдейт (answerCallbackQuery не считаем)
+REPLY_METHODS = {'sendMessage', 'editMessageText'}
+
+
+def make_user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+
+
+def make_message(message_id: int, user_id: int, text: str, sender: dict) -> dict:
+    return {'message_id': message_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': user_id, 'type': 'private'}, 'from': sender}
+
+
+def make_update(update_id: int, user_id: int, step: int) -> dict:
+    """Шаг 0 - /start, 1 - "Найти игру", 2 - "Назад"."""
+    if step == 0:
+        message = make_message(update_id, user_id, '/start', make_user(user_id))
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+        return {'update_id': update_id, 'message': message}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': make_user(user_id),
+            'chat_instance': str(user_id),
+            'data': 'find_game' if step == 1 else 'back_to_start',
+            'message': make_message(update_id, user_id, 'menu', BOT_USER),
+        },
+    }
+
+
+class FakeBotAPI:
+    """Отвечает на вызовы Bot API так, чтобы aiogram смог разобрать результат."""
+
+    def __init__(self):
+        self.calls = 0
+        self.methods = Counter()
+        self.replies = 0
+        self.all_replied = asyncio.Event()
+        self.expected = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        await request.post()
+        self.calls += 1
+        self.methods[method] += 1
+        if method in REPLY_METHODS:
+            self.replies += 1
+            if self.expected is not None and self.replies >= self.expected:
+                self.all_replied.set()
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in REPLY_METHODS:
+            result = make_message(self.calls, 1, 'ok', BOT_USER)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+
+async def wait_for_bot(session: ClientSession, url: str):
+    while True:
+        try:
+            # На GET вебхук отвечает 405 - значит сервер бота уже поднят
+            async with session.get(url) as response:
+                return response.status
+        except ClientError:
+            await asyncio.sleep(0.5)
+
+
+async def main(args):
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.api_port).start()
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': webhook_secret} if webhook_secret else {}
+    latencies = []
+    queue = asyncio.Queue()
+    for update_id in range(args.updates):
+        queue.put_nowait(update_id)
+
+    async with ClientSession(headers=headers) as session:
+        print(f'Жду бота на {args.webhook} ...')
+        await wait_for_bot(session, args.webhook)
+        api.replies = 0
+        api.expected = args.updates
+
+        async def sender():
+            while not queue.empty():
+                update_id = queue.get_nowait()
+                # Каждый пользователь по кругу: /start -> "Найти игру" -> "Назад"
+                step = (update_id // args.users) % 3
+                update = make_update(update_id, 100_000 + update_id % args.users, step)
+                # --taps > 1: то же нажатие кнопки приходит несколько раз подряд, как при двойном тапе
+                taps = args.taps if 'callback_query' in update else 1
+                await asyncio.gather(*(post(update) for _ in range(taps)))
+
+        async def post(update: dict):
+            started = time.perf_counter()
+            async with session.post(args.webhook, json=update) as response:
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+        posted = time.perf_counter() - started
+        try:
+            await asyncio.wait_for(api.all_replied.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    latencies.sort()
+    print(f'отправлено {len(latencies)} апдейтов за {posted:.2f} s ({len(latencies) / posted:.0f}/s), '
+          f'POST p50 {statistics.median(latencies) * 1000:.1f} ms p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms')
+    print(f'ответов бота {api.replies}/{args.updates} за {elapsed:.2f} s ({api.replies / elapsed:.0f}/s)')
+    print('вызовы Bot API:', ', '.join(f'{method} {count}' for method, count in api.methods.most_common()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--webhook', default=f'http://127.0.0.1:{webhook_port}{webhook_path}')
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--taps', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=30)
+    asyncio.run(main(parser.parse_args()))